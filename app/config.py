@@ -0,0 +1,51 @@
+import os
+
+
+AUTH_CACHE_SIZE = int(os.getenv("TALUATION_AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("TALUATION_AUTH_CACHE_TTL", "30"))
+AUTH_TOKEN_TTL = int(os.getenv("TALUATION_AUTH_TOKEN_TTL", str(7 * 24 * 3600)))
+AUTH_TOKEN_BYTES = int(os.getenv("TALUATION_AUTH_TOKEN_BYTES", "32"))
+
+REPOSITORY_CACHE_SIZE = int(os.getenv("TALUATION_REPOSITORY_CACHE_SIZE", "10000"))
+REPOSITORY_CACHE_TTL = float(os.getenv("TALUATION_REPOSITORY_CACHE_TTL", "30"))
+ETAG_TTL = int(os.getenv("TALUATION_ETAG_TTL", "30"))
+
+DB_URL = os.getenv("TALUATION_DB_URL", "ws://127.0.0.1:5070")
+DB_USERNAME = os.getenv("TALUATION_DB_USERNAME", "root")
+DB_PASSWORD = os.getenv("TALUATION_DB_PASSWORD", "root")
+DB_NAMESPACE = os.getenv("TALUATION_DB_NAMESPACE", "main")
+DB_DATABASE = os.getenv("TALUATION_DB_DATABASE", "test")
+
+DB_MIGRATE_ON_STARTUP = os.getenv("TALUATION_DB_MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+DB_POOL_SIZE = int(os.getenv("TALUATION_DB_POOL_SIZE", "8"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("TALUATION_DB_POOL_ACQUIRE_TIMEOUT", "10"))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("TALUATION_DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+DB_POOL_RECONNECT_ATTEMPTS = int(os.getenv("TALUATION_DB_POOL_RECONNECT_ATTEMPTS", "5"))
+DB_POOL_RECONNECT_BACKOFF = float(os.getenv("TALUATION_DB_POOL_RECONNECT_BACKOFF", "0.2"))
+DB_POOL_RECONNECT_BACKOFF_MAX = float(os.getenv("TALUATION_DB_POOL_RECONNECT_BACKOFF_MAX", "5"))
+
+DB_TRANSACTION_RETRIES = int(os.getenv("TALUATION_DB_TRANSACTION_RETRIES", "5"))
+DB_TRANSACTION_RETRY_BACKOFF = float(os.getenv("TALUATION_DB_TRANSACTION_RETRY_BACKOFF", "0.01"))
+
+RANKING_PRIOR_MEAN = float(os.getenv("TALUATION_RANKING_PRIOR_MEAN", "3"))
+RANKING_PRIOR_WEIGHT = float(os.getenv("TALUATION_RANKING_PRIOR_WEIGHT", "5"))
+
+PAGE_SIZE_DEFAULT = int(os.getenv("TALUATION_PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("TALUATION_PAGE_SIZE_MAX", "500"))
+
+EXPORT_BATCH_SIZE = int(os.getenv("TALUATION_EXPORT_BATCH_SIZE", "1000"))
+
+ARGON2_TIME_COST = int(os.getenv("TALUATION_ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("TALUATION_ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("TALUATION_ARGON2_PARALLELISM", "4"))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("TALUATION_PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 1)))
+
+SNAPSHOT_PATH = os.getenv("TALUATION_SNAPSHOT_PATH", "")
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("TALUATION_SNAPSHOT_REFRESH_INTERVAL", "300"))
+
+JOB_REGISTRY_SIZE = int(os.getenv("TALUATION_JOB_REGISTRY_SIZE", "1000"))
+JOB_TTL = float(os.getenv("TALUATION_JOB_TTL", "3600"))
+
+SLOW_QUERY_THRESHOLD = float(os.getenv("TALUATION_SLOW_QUERY_THRESHOLD", "0.2"))
+QUERY_STATS_SIZE = int(os.getenv("TALUATION_QUERY_STATS_SIZE", "500"))
@@ -1,4 +1,316 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
+from fastapi.logger import logger
 from surrealdb.connections.async_ws import AsyncWsSurrealConnection
-from surrealdb import AsyncSurreal
+from surrealdb import AsyncSurreal, RecordID, Table
+from websockets.exceptions import WebSocketException
+import asyncio
+import random
+import time
 
-db: AsyncWsSurrealConnection = AsyncSurreal("ws://127.0.0.1:5070")  # type: ignore we use async ws connection
+from app.config import (
+    DB_URL,
+    DB_USERNAME,
+    DB_PASSWORD,
+    DB_NAMESPACE,
+    DB_DATABASE,
+    DB_POOL_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    DB_POOL_RECONNECT_ATTEMPTS,
+    DB_POOL_RECONNECT_BACKOFF,
+    DB_POOL_RECONNECT_BACKOFF_MAX,
+    DB_TRANSACTION_RETRIES,
+    DB_TRANSACTION_RETRY_BACKOFF,
+)
+from app.utils.metrics import metrics
+from app.utils.querylog import query_log
+
+CONNECTION_ERRORS = (WebSocketException, OSError, asyncio.TimeoutError)
+FAILED_TRANSACTION = "The query was not executed due to a failed transaction"
+TRANSACTION_CONFLICT = "can be retried"
+
+Thing = Union[str, RecordID, Table]
+T = TypeVar("T")
+
+
+def target(thing: Thing) -> str:
+    # The table a facade call works on; record keys are left out so calls on
+    # different records of a table share one query log entry.
+    if isinstance(thing, RecordID):
+        return f"{thing.table_name}:$id"
+    if isinstance(thing, Table):
+        return thing.table_name
+    return thing.split(":", 1)[0] + (":$id" if ":" in thing else "")
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        url: str,
+        credentials: Dict[str, Any],
+        namespace: str,
+        database: str,
+        size: int = 8,
+        acquire_timeout: float = 10,
+        health_check_interval: float = 30,
+        reconnect_attempts: int = 5,
+        reconnect_backoff: float = 0.2,
+        reconnect_backoff_max: float = 5,
+    ):
+        self.url = url
+        self.credentials = credentials
+        self.namespace = namespace
+        self.database = database
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.reconnect_attempts = max(1, reconnect_attempts)
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_backoff_max = reconnect_backoff_max
+
+        # Idle slots; `None` marks a slot whose connection was dropped and has
+        # to be re-established by whoever acquires it next.
+        self._idle: asyncio.Queue[Optional[AsyncWsSurrealConnection]] = asyncio.Queue()
+        self._variables: Dict[str, Any] = {}
+        self._variables_version = 0
+        self._applied_versions: Dict[int, int] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = True
+
+        self.in_use = 0
+        self.waiting = 0
+        self.reconnects = 0
+
+    async def open(self) -> None:
+        if not self._closed:
+            return
+        self._closed = False
+        self._idle = asyncio.Queue()
+
+        connections = await asyncio.gather(
+            *(self._connect() for _ in range(self.size)), return_exceptions=True
+        )
+        errors = [c for c in connections if isinstance(c, BaseException)]
+        for conn in connections:
+            self._idle.put_nowait(None if isinstance(conn, BaseException) else conn)
+        if len(errors) == len(connections):
+            await self.close()
+            raise errors[0]
+
+        if self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AsyncWsSurrealConnection]:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed.")
+
+        self.waiting += 1
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), self.acquire_timeout)
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        try:
+            if conn is None:
+                conn = await self._connect_with_backoff()
+            await self._apply_variables(conn)
+            yield conn
+        except (*CONNECTION_ERRORS, asyncio.CancelledError):
+            # A cancelled call may leave a response unread on the socket, so
+            # the connection cannot be handed to anyone else.
+            await self._discard(conn)
+            conn = None
+            raise
+        finally:
+            self.in_use -= 1
+            if self._closed:
+                await self._discard(conn)
+            else:
+                self._idle.put_nowait(conn)
+
+    async def run(
+        self,
+        operation: str,
+        statement: str,
+        params: Any,
+        call: Callable[[AsyncWsSurrealConnection], Awaitable[T]],
+    ) -> T:
+        # Every facade call goes through here: it is timed, including the
+        # wait for a connection, counted towards the current request's
+        # database time and aggregated by statement in the query log.
+        started = time.perf_counter()
+        result: Any = None
+        error: Optional[str] = None
+        try:
+            async with self.acquire() as conn:
+                result = await call(conn)
+            return result
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.record_query(operation, seconds)
+            query_log.record(operation, statement, params, seconds, result, error)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "reconnects": self.reconnects,
+        }
+
+    async def _connect(self) -> AsyncWsSurrealConnection:
+        conn: AsyncWsSurrealConnection = AsyncSurreal(self.url)  # type: ignore we use async ws connection
+        try:
+            await conn.connect()
+            await conn.signin(self.credentials)
+            await conn.use(self.namespace, self.database)
+        except BaseException:
+            await self._discard(conn)
+            raise
+        return conn
+
+    async def _connect_with_backoff(self) -> AsyncWsSurrealConnection:
+        delay = self.reconnect_backoff
+        for attempt in range(self.reconnect_attempts):
+            try:
+                conn = await self._connect()
+                self.reconnects += 1
+                return conn
+            except CONNECTION_ERRORS as e:
+                if attempt + 1 == self.reconnect_attempts:
+                    raise
+                logger.warning(f"Database reconnect attempt {attempt + 1} failed: {e}")
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, self.reconnect_backoff_max)
+        raise RuntimeError("unreachable")
+
+    async def _apply_variables(self, conn: AsyncWsSurrealConnection) -> None:
+        if self._applied_versions.get(id(conn), 0) == self._variables_version:
+            return
+        for key, value in self._variables.items():
+            await conn.let(key, value)
+        self._applied_versions[id(conn)] = self._variables_version
+
+    async def _discard(self, conn: Optional[AsyncWsSurrealConnection]) -> None:
+        if conn is None:
+            return
+        self._applied_versions.pop(id(conn), None)
+        if conn.socket is not None:
+            try:
+                await conn.socket.close()
+            except Exception:
+                pass
+            conn.socket = None
+
+    async def _health_check_loop(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            for _ in range(self._idle.qsize()):
+                try:
+                    async with self.acquire() as conn:
+                        await asyncio.wait_for(conn.query("RETURN true"), self.acquire_timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Database health check failed: {e}")
+
+    async def query(self, query: str, params: Optional[dict] = None) -> Any:
+        return await self.run("query", query, params, lambda conn: conn.query(query, params))
+
+    async def query_raw(self, query: str, params: Optional[dict] = None) -> dict:
+        return await self.run("query_raw", query, params, lambda conn: conn.query_raw(query, params))
+
+    async def select(self, thing: Thing) -> Union[List[dict], dict]:
+        return await self.run("select", f"SELECT {target(thing)}", None, lambda conn: conn.select(thing))
+
+    async def create(self, thing: Thing, data: Optional[Union[List[dict], dict]] = None) -> Union[List[dict], dict]:
+        return await self.run("create", f"CREATE {target(thing)}", data, lambda conn: conn.create(thing, data))
+
+    async def insert(self, table: Union[str, Table], data: Union[List[dict], dict]) -> Union[List[dict], dict]:
+        return await self.run("insert", f"INSERT INTO {target(table)}", data, lambda conn: conn.insert(table, data))
+
+    async def update(self, thing: Thing, data: Optional[Dict] = None) -> Union[List[dict], dict]:
+        return await self.run("update", f"UPDATE {target(thing)}", data, lambda conn: conn.update(thing, data))
+
+    async def upsert(self, thing: Thing, data: Optional[Dict] = None) -> Union[List[dict], dict]:
+        return await self.run("upsert", f"UPSERT {target(thing)}", data, lambda conn: conn.upsert(thing, data))
+
+    async def merge(self, thing: Thing, data: Optional[Dict] = None) -> Union[List[dict], dict]:
+        return await self.run("merge", f"MERGE {target(thing)}", data, lambda conn: conn.merge(thing, data))
+
+    async def delete(self, thing: Thing) -> Union[List[dict], dict]:
+        return await self.run("delete", f"DELETE {target(thing)}", None, lambda conn: conn.delete(thing))
+
+    async def let(self, key: str, value: Any) -> None:
+        # Session variables live on each connection, so they are recorded here
+        # and replayed onto every connection the next time it is acquired.
+        self._variables[key] = value
+        self._variables_version += 1
+        async with self.acquire():
+            pass
+
+
+class QueryError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+async def query_all(db: AsyncWsSurrealConnection, query: str, params: Optional[dict] = None) -> List[Any]:
+    response = await db.query_raw(query, params)
+    if response.get("error") is not None:
+        raise QueryError(str(response["error"]))
+
+    results = response.get("result") or []
+    errors = [str(r.get("result")) for r in results if r.get("status") != "OK"]
+    if errors:
+        # Inside a transaction every other statement reports the generic
+        # "failed transaction" error, so surface the one that caused it.
+        raise QueryError(next((e for e in errors if FAILED_TRANSACTION not in e), errors[0]))
+    return [r.get("result") for r in results]
+
+
+async def run_transaction(db: AsyncWsSurrealConnection, query: str, params: Optional[dict] = None) -> List[Any]:
+    # Concurrent writers of the same stats rows fail each other's commit with
+    # a conflict. The losing transaction was rolled back as a whole, so it is
+    # simply run again after a short, jittered pause.
+    delay = DB_TRANSACTION_RETRY_BACKOFF
+    attempt = 0
+    while True:
+        try:
+            return await query_all(db, query, params)
+        except QueryError as e:
+            if TRANSACTION_CONFLICT not in e.message or attempt >= DB_TRANSACTION_RETRIES:
+                raise
+        attempt += 1
+        await asyncio.sleep(delay + random.uniform(0, delay))
+        delay *= 2
+
+
+db: AsyncWsSurrealConnection = ConnectionPool(  # type: ignore the pool mirrors the async ws connection API
+    DB_URL,
+    credentials={"username": DB_USERNAME, "password": DB_PASSWORD},
+    namespace=DB_NAMESPACE,
+    database=DB_DATABASE,
+    size=DB_POOL_SIZE,
+    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+    reconnect_attempts=DB_POOL_RECONNECT_ATTEMPTS,
+    reconnect_backoff=DB_POOL_RECONNECT_BACKOFF,
+    reconnect_backoff_max=DB_POOL_RECONNECT_BACKOFF_MAX,
+)
@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.logger import logger
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,28 +8,38 @@ from contextlib import asynccontextmanager
 from pydantic import BaseModel
 
 from app import routes
+from app.config import DB_MIGRATE_ON_STARTUP
 from app.db import db
-from app.utils.auth import AuthMiddleware
+from app.migrations import migrate
+from app.repositories.cache import repository_cache
+from app.utils.auth import AuthMiddleware, AuthRoute
+from app.utils.metrics import MetricsMiddleware, counter, gauge, metrics
+from app.utils.password import metrics as password_metrics
+from app.utils.jobs import jobs
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     try:
-        await db.signin({"username": "root", "password": "root"})
-        await db.use("main", "test")
+        await db.open()  # type: ignore db is a connection pool
         logger.info("Connected to database.")
+        if DB_MIGRATE_ON_STARTUP:
+            for migration in await migrate(db):
+                logger.info(f"Applied migration {migration.version}: {migration.name}")
         yield
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
     finally:
-        if db.close:
-            await db.close()
+        # Let background jobs finish their transactions before the pool goes.
+        await jobs.wait()
+        await db.close()
 
 
 app = FastAPI(
     title="Taluation",
     description="Teaching Evaluation System",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -47,15 +58,54 @@ app.add_middleware(
         "/docs",
         "/openapi.json",
         "/redoc",
+        "/metrics",
     ],
 )
 
+# Added last so it wraps every other middleware, authentication included.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(routes.account, prefix="/account")
 app.include_router(routes.cls, prefix="/class")
 app.include_router(routes.evaluation, prefix="/evaluation")
+app.include_router(routes.job, prefix="/job")
+app.include_router(routes.admin, prefix="/admin")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    lines = metrics.render()
+
+    pool = db.stats()  # type: ignore db is a connection pool
+    for key in ("size", "idle", "in_use", "waiting"):
+        gauge(lines, f"taluation_db_pool_{key}", f"Database pool connections: {key}.", {(): pool[key]})
+    counter(lines, "taluation_db_pool_reconnects_total", "Database reconnections.", {(): pool["reconnects"]})
+
+    password = password_metrics.snapshot()
+    for key in ("waiting", "running", "queue_seconds_max"):
+        gauge(lines, f"taluation_password_{key}", f"Password hashing: {key}.", {(): password[key]})
+    for key in ("completed", "queue_seconds_total", "hash_seconds_total"):
+        name = key if key.endswith("_total") else f"{key}_total"
+        counter(lines, f"taluation_password_{name}", f"Password hashing: {key}.", {(): password[key]})
 
+    cache = repository_cache.stats()
+    gauge(lines, "taluation_repository_cache_size", "Repository cache entries.", {(): cache["size"]})
+    for key in ("hits", "misses"):
+        counter(
+            lines,
+            f"taluation_repository_cache_{key}_total",
+            f"Repository cache {key}.",
+            {(("table", table),): values[key] for table, values in cache["tables"].items()},
+        )
+    return "\n".join(lines) + "\n"
 
-@app.get("/announce")
+
+# Protected like every other route, so the body AuthMiddleware unwraps
+# (`{"auth": ..., "data": ...}`) has to be read back through AuthRoute.
+announce = APIRouter(route_class=AuthRoute)
+
+
+@announce.get("/announce")
 async def getAnnounce():
     return await db.query("RETURN $announce")
 
@@ -64,9 +114,12 @@ class Announce(BaseModel):
     announce: str
 
 
-@app.put("/announce")
+@announce.put("/announce")
 async def putAnnounce(data: Announce):
     return await db.let("announce", data.announce)
 
 
+app.include_router(announce)
+
+
 app.mount("/", StaticFiles(directory="dist", html=True), name="dist")
@@ -0,0 +1,103 @@
+from typing import List, NamedTuple, Set
+
+from surrealdb import AsyncWsSurrealConnection, RecordID
+from app.db import QueryError, query_all
+from app.repositories.stats import REBUILD_STATS, StatsRepository
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: str
+
+
+# Append new migrations with the next version; never edit one that has shipped.
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "core tables and indexes",
+        """
+        DEFINE TABLE IF NOT EXISTS account SCHEMALESS;
+        DEFINE FIELD IF NOT EXISTS username ON account TYPE string;
+        DEFINE FIELD IF NOT EXISTS email ON account TYPE string;
+        DEFINE FIELD IF NOT EXISTS phone ON account TYPE string;
+        DEFINE FIELD IF NOT EXISTS type ON account TYPE string;
+        DEFINE INDEX IF NOT EXISTS account_username ON account FIELDS username UNIQUE;
+        DEFINE INDEX IF NOT EXISTS account_email ON account FIELDS email UNIQUE;
+        DEFINE INDEX IF NOT EXISTS account_phone ON account FIELDS phone UNIQUE;
+
+        DEFINE TABLE IF NOT EXISTS auth SCHEMALESS;
+        DEFINE FIELD IF NOT EXISTS username ON auth TYPE string;
+        DEFINE FIELD IF NOT EXISTS account ON auth TYPE option<record<account>>;
+        DEFINE FIELD IF NOT EXISTS expires_at ON auth TYPE option<datetime>;
+        DEFINE INDEX IF NOT EXISTS auth_username ON auth FIELDS username;
+
+        DEFINE TABLE IF NOT EXISTS class SCHEMALESS;
+        DEFINE FIELD IF NOT EXISTS name ON class TYPE string;
+        DEFINE FIELD IF NOT EXISTS teacher ON class TYPE record<account>;
+        DEFINE FIELD IF NOT EXISTS category ON class TYPE string;
+        DEFINE INDEX IF NOT EXISTS class_name ON class FIELDS name UNIQUE;
+        DEFINE INDEX IF NOT EXISTS class_teacher ON class FIELDS teacher;
+        DEFINE INDEX IF NOT EXISTS class_category ON class FIELDS category;
+
+        DEFINE TABLE IF NOT EXISTS evaluation SCHEMALESS;
+        DEFINE FIELD IF NOT EXISTS user ON evaluation TYPE record<account>;
+        DEFINE FIELD IF NOT EXISTS cls ON evaluation TYPE record<class>;
+        DEFINE FIELD IF NOT EXISTS score ON evaluation TYPE int;
+        DEFINE INDEX IF NOT EXISTS evaluation_user_cls ON evaluation FIELDS user, cls UNIQUE;
+        DEFINE INDEX IF NOT EXISTS evaluation_user ON evaluation FIELDS user;
+        DEFINE INDEX IF NOT EXISTS evaluation_cls ON evaluation FIELDS cls;
+        """,
+    ),
+    Migration(
+        2,
+        "statistics indexes",
+        """
+        DEFINE TABLE IF NOT EXISTS class_stats SCHEMALESS;
+        DEFINE INDEX IF NOT EXISTS class_stats_teacher ON class_stats FIELDS teacher;
+
+        DEFINE TABLE IF NOT EXISTS teacher_stats SCHEMALESS;
+        DEFINE INDEX IF NOT EXISTS teacher_stats_score ON teacher_stats FIELDS score;
+        """,
+    ),
+    # Stats are only maintained incrementally from here on, so evaluations
+    # written before they existed have to be counted once.
+    Migration(3, "seed statistics from existing evaluations", REBUILD_STATS),
+]
+
+
+async def applied_versions(db: AsyncWsSurrealConnection) -> Set[int]:
+    rows: List[int] = await db.query("SELECT VALUE record::id(id) FROM migration")  # type: ignore
+    return set(rows or [])
+
+
+async def migrate(db: AsyncWsSurrealConnection) -> List[Migration]:
+    applied = await applied_versions(db)
+    ran: List[Migration] = []
+    for migration in sorted(MIGRATIONS):
+        if migration.version in applied:
+            continue
+        try:
+            # The migration record is written in the same transaction, so a
+            # second worker starting at the same time fails on its CREATE
+            # instead of applying the migration twice.
+            await query_all(
+                db,
+                f"""
+                BEGIN TRANSACTION;
+                {migration.statements}
+                CREATE $migration SET name = $name, applied_at = time::now();
+                COMMIT TRANSACTION;
+                """,
+                {
+                    "migration": RecordID("migration", migration.version),
+                    "name": migration.name,
+                    **StatsRepository.prior(),
+                },
+            )
+        except QueryError as e:
+            if "already exists" in e.message and migration.version in await applied_versions(db):
+                continue
+            raise QueryError(f"Migration {migration.version} ({migration.name}) failed: {e.message}")
+        ran.append(migration)
+    return ran
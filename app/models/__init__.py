@@ -10,9 +10,16 @@ class Response(BaseModel, Generic[T]):
     message: str
     data: Optional[T] = None
     success: bool
+    next_cursor: Optional[str] = None
 
-    def __init__(self, message: str, data: Optional[T] = None, success: bool = True):
-        super().__init__(message=message, data=data, success=success)
+    def __init__(
+        self,
+        message: str,
+        data: Optional[T] = None,
+        success: bool = True,
+        next_cursor: Optional[str] = None,
+    ):
+        super().__init__(message=message, data=data, success=success, next_cursor=next_cursor)
 
 
 class Record(BaseModel):
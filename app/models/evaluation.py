@@ -64,3 +64,49 @@ class EvaluationStats(BaseModel):
     class_id: Optional[str]
     class_name: Optional[str]
     distribution: Dict[str, int]
+
+
+class ClassStatsModel(BaseModel, arbitrary_types_allowed=True):
+    id: Optional[RecordID] = None
+    cls: RecordID
+    teacher: Optional[RecordID] = None
+    count: int = 0
+    sum: int = 0
+    distribution: Dict[str, int] = {}
+    class_name: Optional[str] = None
+
+    def to_stats(self, class_name: Optional[str] = None) -> EvaluationStats:
+        distribution = {str(i): int(self.distribution.get(str(i), 0)) for i in range(1, 6)}
+        scores = [int(k) for k, v in distribution.items() if v > 0]
+        return EvaluationStats(
+            count=self.count,
+            average=round(self.sum / self.count, 2) if self.count > 0 else 0,
+            max=max(scores) if scores else 0,
+            min=min(scores) if scores else 0,
+            class_id=str(self.cls.id),
+            class_name=class_name or self.class_name,
+            distribution=distribution,
+        )
+
+
+class TeacherRanking(BaseModel):
+    rank: int
+    teacher_id: str
+    teacher_name: Optional[str]
+    count: int
+    average: float
+    score: float
+
+
+class CrossTabStats(BaseModel):
+    category: str
+    teacher_id: str
+    teacher_name: Optional[str] = None
+    count: int
+    average: float
+    std: float
+    p25: int
+    p50: int
+    p75: int
+    p90: int
+    distribution: Dict[str, int]
@@ -0,0 +1,13 @@
+from typing import Any, Literal, Optional
+from pydantic import BaseModel
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    owner: str
+    status: Literal["pending", "running", "succeeded", "failed"] = "pending"
+    created_at: float
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
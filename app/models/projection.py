@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Read-only views built straight from database rows for the list endpoints.
+# They skip pydantic validation entirely and are serialized natively by
+# orjson, so each row is converted exactly once. Rows come from our own
+# tables and are trusted; anything written still goes through the models.
+# Not frozen only because frozen dataclasses are several times slower to
+# construct; nothing modifies them after `from_row`.
+
+
+@dataclass(slots=True)
+class EvaluationRow:
+    id: Optional[str]
+    user: str
+    cls: str
+    score: int
+    comment: str
+
+    @staticmethod
+    def from_row(
+        row: dict, usernames: Dict[str, str] = {}, class_names: Dict[str, str] = {}
+    ) -> "EvaluationRow":
+        user = str(row["user"].id)
+        cls = str(row["cls"].id)
+        return EvaluationRow(
+            id=str(row["id"].id),
+            user=usernames.get(user, user),
+            cls=class_names.get(cls, cls),
+            score=row["score"],
+            comment=row["comment"],
+        )
+
+
+@dataclass(slots=True)
+class ClassRow:
+    id: Optional[str]
+    name: str
+    teacher: str
+    category: str
+    description: str
+
+    @staticmethod
+    def from_row(row: dict) -> "ClassRow":
+        return ClassRow(
+            id=str(row["id"].id),
+            name=row["name"],
+            teacher=str(row["teacher"].id),
+            category=row["category"],
+            description=row["description"],
+        )
+
+    def named(self, teacher: Optional[str]) -> "ClassRow":
+        return ClassRow(self.id, self.name, teacher or self.teacher, self.category, self.description)
+
+
+@dataclass(slots=True)
+class AccountRow:
+    id: Optional[str]
+    username: str
+    email: str
+    phone: str
+    type: str
+
+    @staticmethod
+    def from_row(row: dict) -> "AccountRow":
+        return AccountRow(
+            id=str(row["id"].id),
+            username=row["username"],
+            email=row["email"],
+            phone=row["phone"],
+            type=row["type"],
+        )
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class QueryStat(BaseModel):
+    operation: str
+    statement: str
+    params: str
+    calls: int = 0
+    slow_calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
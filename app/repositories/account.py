@@ -1,19 +1,70 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+import re
 
 from surrealdb import AsyncWsSurrealConnection, RecordID
+from app.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, AUTH_TOKEN_TTL
+from app.db import QueryError, query_all, run_transaction
 from app.models.account import Auth, AccountModel, Account
+from app.models.projection import AccountRow
+from app.repositories.cache import repository_cache
+from app.repositories.snapshot import SnapshotRepository
+from app.repositories.stats import StatsRepository
+from app.utils.cache import TTLCache
+from app.utils.pagination import keyset, split_page
+from app.utils.token import token_digest
+
+ACCOUNT_NOT_FOUND = "Account not found."
+# Raised by the unique username, email and phone indexes.
+DUPLICATE_ACCOUNT = re.compile(r"Database index `account_(username|email|phone)` already contains")
+
+# username -> (digest of the last verified token, its account); bounded by
+# AUTH_CACHE_TTL so a token revoked by another worker process stops being
+# accepted here within that window, and never kept past the token's own expiry.
+auth_cache: TTLCache[str, Tuple[str, AccountModel]] = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
 
 class AccountRepository:
     @staticmethod
-    async def verify_auth(db: AsyncWsSurrealConnection, username: str, auth_token: str) -> bool:
-        token = await db.query(
-            "SELECT * FROM auth WHERE username = $username AND token = $auth_token",
+    def auth_id(token: str) -> RecordID:
+        # The digest is the record key, so a lookup is a primary key read and
+        # two sessions can never share a token.
+        return RecordID("auth", token_digest(token))
+
+    @staticmethod
+    async def create_token(db: AsyncWsSurrealConnection, account: AccountModel, token: str) -> None:
+        await db.query(
+            "CREATE $auth SET username = $username, account = $account, expires_at = time::now() + type::duration($ttl)",
             {
-                "username": username,
-                "auth_token": auth_token,
+                "auth": AccountRepository.auth_id(token),
+                "username": account.username,
+                "account": account.id,
+                "ttl": f"{AUTH_TOKEN_TTL}s",
             },
         )
-        return bool(token)
+
+    @staticmethod
+    async def verify_auth(db: AsyncWsSurrealConnection, username: str, auth_token: str) -> Optional[AccountModel]:
+        auth_id = AccountRepository.auth_id(auth_token)
+        cached = auth_cache.get(username)
+        if cached is not None and cached[0] == auth_id.id:
+            # Handlers may modify the account they are given.
+            return cached[1].model_copy()
+
+        sessions: List[dict] = await db.query(  # type: ignore
+            """
+            SELECT username, time::unix(expires_at) - time::unix(time::now()) AS remaining, account.* AS account
+            FROM $auth WHERE expires_at > time::now()
+            """,
+            {
+                "auth": auth_id,
+            },
+        )
+        if not sessions or sessions[0]["username"] != username or not sessions[0].get("account"):
+            return None
+
+        account = Account(**sessions[0]["account"]).to_model()
+        auth_cache.set(username, (auth_id.id, account), sessions[0]["remaining"])
+        return account.model_copy()
 
     @staticmethod
     async def account_exists(db: AsyncWsSurrealConnection, account: Account) -> bool:
@@ -28,65 +79,143 @@ class AccountRepository:
         return len(accounts) > 0
 
     @staticmethod
-    async def get_non_admin_accounts(db: AsyncWsSurrealConnection) -> List[AccountModel]:
-        accounts: List[dict] = await db.query(  # type: ignore
-            "SELECT * FROM account where type != 'admin'",
+    async def get_non_admin_accounts(
+        db: AsyncWsSurrealConnection, limit: int, after: Optional[str] = None
+    ) -> Tuple[List[AccountRow], Optional[str]]:
+        query, params = keyset(
+            "account", ["type != 'admin'"], limit, after, fields="id, username, email, phone, type"
         )
+        accounts: List[dict] = await db.query(query, params)  # type: ignore
 
-        if not accounts or len(accounts) == 0:
-            return []
-        return [Account(**account).to_model() for account in accounts]
+        rows, next_cursor = split_page(accounts, limit)
+        return [AccountRow.from_row(account) for account in rows], next_cursor
 
     @staticmethod
     async def get_account_by_name(
-        db: AsyncWsSurrealConnection, username: str
+        db: AsyncWsSurrealConnection, username: str, fresh: bool = False
     ) -> Optional[AccountModel]:
-        accounts: List[dict] = await db.query(  # type: ignore
-            "SELECT * FROM account WHERE username = $username",
-            {
-                "username": username,
-            },
-        )
-        if not accounts or len(accounts) == 0:
-            return None
-        return Account(**accounts[0]).to_model()
+        # Credential checks pass `fresh`: the cache may still hold an old
+        # password, or "not found" for an account another worker just created.
+        if fresh:
+            return (await AccountRepository.query_accounts_by_names(db, [username])).get(username)
+        return (await AccountRepository.get_accounts_by_names(db, [username])).get(username)
 
     @staticmethod
     async def get_account_by_id(db: AsyncWsSurrealConnection, id: str) -> Optional[AccountModel]:
-        account: Optional[dict] = await db.select(RecordID("account", id))  # type: ignore
-        if account is None:
-            return None
-        return Account(**account).to_model()
+        return (await AccountRepository.get_accounts_by_ids(db, [id])).get(id)
 
     @staticmethod
-    async def delete_token(db: AsyncWsSurrealConnection, username: str) -> None:
-        await db.query(  # type: ignore
-            "DELETE FROM auth WHERE username = $username",
-            {
-                "username": username,
-            },
-        )
+    async def get_accounts_by_ids(db: AsyncWsSurrealConnection, ids: List[str]) -> Dict[str, AccountModel]:
+        if not ids:
+            return {}
+
+        async def load(ids: List[str]) -> Dict[str, AccountModel]:
+            accounts: List[dict] = await db.query(  # type: ignore
+                "SELECT * FROM $ids",
+                {
+                    "ids": [RecordID("account", id) for id in ids],
+                },
+            )
+            if not accounts:
+                return {}
+
+            result: Dict[str, AccountModel] = {}
+            for account in accounts:
+                raw = Account(**account)
+                if raw.id is not None:
+                    result[raw.id] = raw.to_model()
+            return result
+
+        return await repository_cache.read_many("account", "id", ids, load)
 
     @staticmethod
-    async def delete_account(db: AsyncWsSurrealConnection, username: str) -> bool:
-        target_account = await AccountRepository.get_account_by_name(db, username)
-        if target_account is None or target_account.id is None:
-            return False
-        
-        await db.query(
-            "DELETE FROM class WHERE teacher = $teacher",
+    async def create_account(db: AsyncWsSurrealConnection, account: Account) -> None:
+        await query_all(db, "CREATE account CONTENT $account", {"account": account.model_dump(exclude={"id"})})
+        repository_cache.bump("account")
+
+    @staticmethod
+    async def update_account(db: AsyncWsSurrealConnection, account: AccountModel, changes: dict) -> None:
+        # Merges only `changes`, as `account` may be a cached copy.
+        if account.id is None:
+            return
+        await query_all(db, "UPDATE $id MERGE $changes", {"id": account.id, "changes": changes})
+        repository_cache.bump("account")
+        auth_cache.pop(account.username)
+
+    @staticmethod
+    def is_duplicate(error: QueryError) -> bool:
+        return DUPLICATE_ACCOUNT.search(error.message) is not None
+
+    @staticmethod
+    async def get_accounts_by_names(db: AsyncWsSurrealConnection, names: List[str]) -> Dict[str, AccountModel]:
+        if not names:
+            return {}
+
+        async def load(names: List[str]) -> Dict[str, AccountModel]:
+            return await AccountRepository.query_accounts_by_names(db, names)
+
+        return await repository_cache.read_many("account", "name", names, load)
+
+    @staticmethod
+    async def query_accounts_by_names(db: AsyncWsSurrealConnection, names: List[str]) -> Dict[str, AccountModel]:
+        accounts: List[dict] = await db.query(  # type: ignore
+            "SELECT * FROM account WHERE username IN $names",
             {
-                "teacher": RecordID("account", username),
+                "names": names,
             },
         )
+        return {account["username"]: Account(**account).to_model() for account in accounts or []}
 
-        await db.query(
+    @staticmethod
+    async def delete_token(db: AsyncWsSurrealConnection, username: str) -> None:
+        await db.query(  # type: ignore
             "DELETE FROM auth WHERE username = $username",
             {
                 "username": username,
             },
         )
+        auth_cache.pop(username)
+
+    @staticmethod
+    async def delete_account(db: AsyncWsSurrealConnection, username: str) -> bool:
+        # Removes the account with its tokens, the classes it teaches and
+        # every evaluation of those classes or written by it, then recomputes
+        # the stats of whatever classes and teachers those evaluations
+        # counted towards, all in one transaction.
+        try:
+            results = await run_transaction(
+                db,
+                f"""
+                BEGIN TRANSACTION;
+                LET $account = (SELECT VALUE id FROM account WHERE username = $username LIMIT 1)[0];
+                IF $account = NONE {{ THROW "{ACCOUNT_NOT_FOUND}" }};
+                LET $owned = (SELECT VALUE id FROM class WHERE teacher = $account);
+                LET $evaluated = array::distinct((SELECT VALUE cls FROM evaluation WHERE user = $account));
+                LET $classes = array::union($owned, $evaluated);
+                LET $teachers = array::union(
+                    [$account],
+                    array::distinct((SELECT VALUE teacher FROM class WHERE id IN $evaluated AND teacher != NONE))
+                );
+                DELETE evaluation WHERE cls IN $owned;
+                DELETE evaluation WHERE user = $account;
+                DELETE class WHERE teacher = $account;
+                DELETE auth WHERE username = $username;
+                DELETE $account;
+                {StatsRepository.recompute_statements()}
+                RETURN $classes;
+                COMMIT TRANSACTION;
+                """,
+                {"username": username, **StatsRepository.prior()},
+            )
+        except QueryError as e:
+            if ACCOUNT_NOT_FOUND in e.message:
+                return False
+            raise
 
-        await db.delete(target_account.id)
+        auth_cache.pop(username)
+        repository_cache.bump("account", "class")
+        for cls in results[-1] or []:
+            StatsRepository.changed(cls)
+        SnapshotRepository.invalidate()
         return True
 
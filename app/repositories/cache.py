@@ -0,0 +1,112 @@
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, TypeVar
+
+from pydantic import BaseModel
+from app.config import REPOSITORY_CACHE_SIZE, REPOSITORY_CACHE_TTL
+from app.utils.cache import TTLCache
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def copy_value(value: Any) -> Any:
+    # Callers are free to modify what they get back, so never hand out the
+    # cached instances themselves.
+    if isinstance(value, BaseModel):
+        return value.model_copy()
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(copy_value(v) for v in value)
+    if isinstance(value, dict):
+        return {k: copy_value(v) for k, v in value.items()}
+    return value
+
+
+class RepositoryCache:
+    # Read-through cache keyed by (table, key). Every write to a table bumps
+    # its version, which invalidates all entries read at an older version;
+    # other worker processes only see the write once their entries expire.
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries: TTLCache[Tuple[str, Hashable], Tuple[int, Any]] = TTLCache(maxsize, ttl)
+        self.versions: Dict[str, int] = defaultdict(int)
+        self.key_versions: Dict[Tuple[str, Hashable], int] = defaultdict(int)
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    def version(self, table: str) -> int:
+        return self.versions[table]
+
+    def bump(self, *tables: str) -> None:
+        for table in tables:
+            self.versions[table] += 1
+
+    def key_version(self, table: str, key: Hashable) -> Tuple[int, int]:
+        return self.versions[table], self.key_versions[(table, key)]
+
+    def bump_key(self, table: str, key: Hashable) -> None:
+        # Marks a single record as changed for callers that track finer
+        # grained versions; cached reads of the table are left alone.
+        self.key_versions[(table, key)] += 1
+
+    async def read(self, table: str, key: Hashable, load: Callable[[], Awaitable[V]]) -> V:
+        version = self.versions[table]
+        entry = self.entries.get((table, key))
+        if entry is not None and entry[0] == version:
+            self.hits[table] += 1
+            return copy_value(entry[1])
+
+        self.misses[table] += 1
+        value = await load()
+        # Stored under the version seen before loading, so a write that lands
+        # while the query is in flight still invalidates the result.
+        self.entries.set((table, key), (version, value))
+        return copy_value(value)
+
+    async def read_many(
+        self, table: str, kind: str, keys: List[K], load: Callable[[List[K]], Awaitable[Dict[K, V]]]
+    ) -> Dict[K, V]:
+        # Same entries as `read(table, (kind, key), ...)`, with every missing
+        # key fetched by one call of `load`.
+        version = self.versions[table]
+        result: Dict[K, V] = {}
+        missing: List[K] = []
+        for key in dict.fromkeys(keys):
+            entry = self.entries.get((table, (kind, key)))
+            if entry is not None and entry[0] == version:
+                self.hits[table] += 1
+                if entry[1] is not None:
+                    result[key] = copy_value(entry[1])
+            else:
+                missing.append(key)
+
+        if missing:
+            self.misses[table] += len(missing)
+            loaded = await load(missing)
+            for key in missing:
+                value = loaded.get(key)
+                self.entries.set((table, (kind, key)), (version, value))
+                if value is not None:
+                    result[key] = copy_value(value)
+        return result
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        tables = sorted(set(self.hits) | set(self.misses) | set(self.versions))
+        return {
+            "size": len(self.entries),
+            "maxsize": self.entries.maxsize,
+            "tables": {
+                table: {
+                    "version": self.versions[table],
+                    "hits": self.hits[table],
+                    "misses": self.misses[table],
+                }
+                for table in tables
+            },
+        }
+
+
+repository_cache = RepositoryCache(REPOSITORY_CACHE_SIZE, REPOSITORY_CACHE_TTL)
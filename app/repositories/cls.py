@@ -1,8 +1,16 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
-from app.models.cls import DisplayClass, Class
+from app.models.account import AccountModel
+from app.models.cls import DisplayClass, Class, ClassModel
+from app.models.projection import ClassRow
 from surrealdb import AsyncWsSurrealConnection, RecordID
+from app.db import run_transaction
 from app.repositories.account import AccountRepository
+from app.repositories.cache import repository_cache
+from app.repositories.snapshot import SnapshotRepository
+from app.repositories.stats import StatsRepository
+from app.utils.loader import Loader
+from app.utils.pagination import keyset, split_page
 
 class ClassRepository:
     @staticmethod
@@ -14,56 +22,155 @@ class ClassRepository:
         return len(classes) > 0
 
     @staticmethod
-    async def delete_class_by_name(db: AsyncWsSurrealConnection, name: str) -> None:
-        await db.query(
-            "DELETE FROM class WHERE name = $name",
-            {"name": name},
+    async def create_class(db: AsyncWsSurrealConnection, cls: ClassModel) -> None:
+        created = await db.create("class", cls.model_dump(exclude={"id"}))
+        repository_cache.bump("class")
+        if isinstance(created, dict):
+            SnapshotRepository.record_class(created["id"], cls.teacher, cls.category)
+
+    @staticmethod
+    async def update_class(db: AsyncWsSurrealConnection, cls: RecordID, changes: dict) -> None:
+        # Only the changed fields are merged: the caller's copy may come from
+        # a cache, and writing it back whole could undo another worker's edit.
+        # A new teacher takes the class's stats along in the same transaction,
+        # so a submission can never land between the two.
+        moved = "teacher" in changes
+        move_stats = f"""
+            LET $classes = [$cls];
+            LET $teachers = array::compact(array::distinct([$before.teacher, $updated.teacher]));
+            {StatsRepository.recompute_statements()}
+        """
+        results = await run_transaction(
+            db,
+            f"""
+            BEGIN TRANSACTION;
+            LET $before = (SELECT * FROM $cls)[0];
+            LET $updated = (UPDATE $cls MERGE $changes)[0];
+            {move_stats if moved else ""}
+            RETURN $updated;
+            COMMIT TRANSACTION;
+            """,
+            {"cls": cls, "changes": changes, **StatsRepository.prior()},
         )
-    
+        updated = results[-1]
+        repository_cache.bump("class")
+        if moved:
+            StatsRepository.changed(cls)
+        if isinstance(updated, dict):
+            SnapshotRepository.record_class(cls, updated.get("teacher"), updated.get("category") or "")
+
     @staticmethod
     async def delete_class_by_id(db: AsyncWsSurrealConnection, id: str) -> None:
-        await db.delete(RecordID("class", id))
+        # The class goes together with its evaluations and its teacher's
+        # share of the stats.
+        cls = RecordID("class", id)
+        await run_transaction(
+            db,
+            f"""
+            BEGIN TRANSACTION;
+            LET $classes = [$cls];
+            LET $teachers = (SELECT VALUE teacher FROM $cls WHERE teacher != NONE);
+            DELETE evaluation WHERE cls = $cls;
+            DELETE $cls;
+            {StatsRepository.recompute_statements()}
+            COMMIT TRANSACTION;
+            """,
+            {"cls": cls, **StatsRepository.prior()},
+        )
+        repository_cache.bump("class")
+        StatsRepository.changed(cls)
+        SnapshotRepository.remove_class_evaluations(cls)
 
     @staticmethod
     async def get_class_by_id(db: AsyncWsSurrealConnection, id: str) -> Optional[Class]:
-        cls: Optional[dict] = await db.select(RecordID("class", id))  # type: ignore
-        if cls is None:
-            return None
-        return Class(**cls)
+        return (await ClassRepository.get_classes_by_ids(db, [id])).get(id)
+
+    @staticmethod
+    async def get_classes_by_ids(db: AsyncWsSurrealConnection, ids: List[str]) -> Dict[str, Class]:
+        if not ids:
+            return {}
+
+        async def load(ids: List[str]) -> Dict[str, Class]:
+            classes: List[dict] = await db.query(  # type: ignore
+                "SELECT * FROM $ids",
+                {"ids": [RecordID("class", id) for id in ids]},
+            )
+            if not classes:
+                return {}
+
+            result: Dict[str, Class] = {}
+            for cls in classes:
+                c = Class(**cls)
+                if c.id is not None:
+                    result[c.id] = c
+            return result
+
+        return await repository_cache.read_many("class", "id", ids, load)
 
     @staticmethod
     async def get_class_by_name(db: AsyncWsSurrealConnection, name: str) -> Optional[Class]:
-        classes: List[dict] = await db.query(  # type: ignore
-            "SELECT * FROM class WHERE name = $name",
-            {
-                "name": name,
-            },
-        )
-        if not classes or len(classes) == 0:
-            return None
-        return Class(**classes[0])
+        return (await ClassRepository.get_classes_by_names(db, [name])).get(name)
     
     @staticmethod
-    async def get_classes_by_teacher(db: AsyncWsSurrealConnection, teacher_id: RecordID) -> List[Class]:
-        classes: List[dict] = await db.query(  # type: ignore
-            "SELECT * FROM class WHERE teacher = $teacher",
-            {"teacher": teacher_id},
-        )
-        return [Class(**cls) for cls in classes]
+    async def get_classes_by_names(db: AsyncWsSurrealConnection, names: List[str]) -> Dict[str, Class]:
+        if not names:
+            return {}
+
+        async def load(names: List[str]) -> Dict[str, Class]:
+            classes: List[dict] = await db.query(  # type: ignore
+                "SELECT * FROM class WHERE name IN $names",
+                {"names": names},
+            )
+            return {cls["name"]: Class(**cls) for cls in classes or []}
+
+        return await repository_cache.read_many("class", "name", names, load)
 
     @staticmethod
-    async def get_classes(db: AsyncWsSurrealConnection) -> List[Class]:
-        classes: List[dict] = await db.query(  # type: ignore
-            "SELECT * FROM class",
-        )
-        return [Class(**cls) for cls in classes]
-    
+    async def get_rows(
+        db: AsyncWsSurrealConnection, limit: int, after: Optional[str] = None, teacher: Optional[RecordID] = None
+    ) -> Tuple[List[ClassRow], Optional[str]]:
+        # Rows are never modified once built, so the cache hands them out as is.
+        async def load() -> Tuple[List[ClassRow], Optional[str]]:
+            conditions = [] if teacher is None else ["teacher = $teacher"]
+            query, params = keyset("class", conditions, limit, after)
+            classes: List[dict] = await db.query(query, {"teacher": teacher, **params})  # type: ignore
+
+            rows, next_cursor = split_page(classes, limit)
+            return [ClassRow.from_row(row) for row in rows], next_cursor
+
+        key = ("rows", None if teacher is None else str(teacher.id), limit, after)
+        return await repository_cache.read("class", key, load)
+
     @staticmethod
-    async def to_display(db: AsyncWsSurrealConnection, classes: List[Class]) -> List[DisplayClass]:
+    async def name_rows(
+        db: AsyncWsSurrealConnection, rows: List[ClassRow], accounts: Optional[Loader[str, AccountModel]] = None
+    ) -> List[ClassRow]:
+        teacher_ids = [row.teacher for row in rows]
+        if accounts is not None:
+            teachers = await accounts.load_many(teacher_ids)
+        else:
+            teachers = await AccountRepository.get_accounts_by_ids(db, teacher_ids)
+        return [row.named(teachers[row.teacher].username if row.teacher in teachers else None) for row in rows]
+
+    @staticmethod
+    async def to_display(
+        db: AsyncWsSurrealConnection,
+        classes: List[Class],
+        accounts: Optional[Loader[str, AccountModel]] = None,
+    ) -> List[DisplayClass]:
+        teacher_ids = [c.teacher for c in classes]
+        if accounts is not None:
+            teachers = await accounts.load_many(teacher_ids)
+        else:
+            teachers = await AccountRepository.get_accounts_by_ids(db, teacher_ids)
+
+        # Classes may be shared through a request's loaders, so only the
+        # display copies get the teacher's name.
         result = []
         for c in classes:
-            teacher_account = await AccountRepository.get_account_by_id(db, c.teacher)
+            display = c.to_list()
+            teacher_account = teachers.get(c.teacher)
             if teacher_account:
-                c.teacher = teacher_account.username
-            result.append(c.to_list())
+                display.teacher = teacher_account.username
+            result.append(display)
         return result
\ No newline at end of file
@@ -1,50 +1,83 @@
 from app.models.evaluation import EvaluationModel, Evaluation
+from app.models.projection import EvaluationRow
 from surrealdb import AsyncWsSurrealConnection, RecordID
-from typing import Optional, List
-from app.repositories.account import AccountRepository
-from app.repositories.cls import ClassRepository
+from typing import AsyncIterator, Optional, List, Tuple
+import asyncio
+import re
+from app.db import QueryError, run_transaction
+from app.repositories.loader import Loaders
+from app.repositories.snapshot import SnapshotRepository
+from app.repositories.stats import StatsRepository
+from app.utils.pagination import keyset, split_page
+
+CLASS_NOT_FOUND = "Class not found."
+# Raised by the unique (user, cls) index, e.g. "Database index `evaluation_user_cls`
+# already contains [account:a, class:b], with record `evaluation:c`".
+DUPLICATE_EVALUATION = re.compile(r"with record `evaluation:⟨?([^`⟩]+)⟩?`")
 
 
 class EvaluationRepository:
     @staticmethod
-    async def create_evaluation(db: AsyncWsSurrealConnection, evaluation: EvaluationModel) -> Optional[EvaluationModel]:
-        evaluation_model = await db.create(
-            "evaluation", evaluation.model_dump(exclude={"id"})
+    async def submit_evaluation(
+        db: AsyncWsSurrealConnection, user: RecordID, class_name: str, score: int, comment: str
+    ) -> EvaluationModel:
+        results = await run_transaction(
+            db,
+            f"""
+            BEGIN TRANSACTION;
+            LET $cls = (SELECT VALUE id FROM class WHERE name = $class_name LIMIT 1)[0];
+            IF $cls = NONE {{ THROW "{CLASS_NOT_FOUND}" }};
+            LET $evaluation = (CREATE evaluation SET user = $user, cls = $cls, score = $score, comment = $comment)[0];
+            {StatsRepository.score_statements(score)}
+            RETURN $evaluation;
+            COMMIT TRANSACTION;
+            """,
+            {
+                "user": user,
+                "class_name": class_name,
+                "score": score,
+                "comment": comment,
+                "delta": 1,
+                "points": score,
+                **StatsRepository.prior(),
+            },
         )
+        evaluation = EvaluationModel(**results[-1])
+        StatsRepository.changed(evaluation.cls)
+        if evaluation.id is not None:
+            SnapshotRepository.record_evaluation(evaluation.id, evaluation.user, evaluation.cls, evaluation.score)
+        return evaluation
 
-        if evaluation_model is None:
-            return None
-
-        if type(evaluation_model) == dict:
-            return EvaluationModel(**evaluation_model)
-        
-        return None
-    
     @staticmethod
-    async def delete_evaluation(db: AsyncWsSurrealConnection, id: str) -> bool:
-        result = await db.delete(RecordID("evaluation", id))
-        return result is not None
-    
+    def duplicate_of(error: QueryError) -> Optional[str]:
+        match = DUPLICATE_EVALUATION.search(error.message)
+        return match.group(1) if match else None
+
     @staticmethod
-    async def get_evaluations(db: AsyncWsSurrealConnection) -> Optional[List[EvaluationModel]]:
-        result: Optional[List[dict]] = await db.query(  # type: ignore
-            "SELECT * FROM evaluation",
+    async def delete_evaluation(db: AsyncWsSurrealConnection, id: str) -> Optional[EvaluationModel]:
+        # The score being removed is only known once the record is read, so
+        # the class's stats are recomputed in the same transaction rather
+        # than decremented.
+        results = await run_transaction(
+            db,
+            f"""
+            BEGIN TRANSACTION;
+            LET $old = (DELETE $id RETURN BEFORE)[0];
+            LET $classes = array::compact([$old.cls]);
+            LET $teachers = (SELECT VALUE teacher FROM $classes WHERE teacher != NONE);
+            {StatsRepository.recompute_statements()}
+            RETURN $old;
+            COMMIT TRANSACTION;
+            """,
+            {"id": RecordID("evaluation", id), **StatsRepository.prior()},
         )
-        
-        if result is None:
+        if not results[-1]:
             return None
-        elif type(result) == list:
-            return [EvaluationModel(**item) for item in result]
-        
-        return None
 
-    @staticmethod
-    async def delete_evaluations_by_cls_id(db: AsyncWsSurrealConnection, cls: RecordID) -> bool:
-        result = await db.query(
-            "DELETE FROM evaluation WHERE cls = $cls",
-            {"cls": cls}
-        )
-        return result is not None
+        evaluation = EvaluationModel(**results[-1])
+        StatsRepository.changed(evaluation.cls)
+        SnapshotRepository.remove_evaluation(RecordID("evaluation", id))
+        return evaluation
     
     @staticmethod
     async def get_evaluations_by_user_id_and_cls_id(db: AsyncWsSurrealConnection, user: RecordID, cls: RecordID) -> Optional[EvaluationModel]:
@@ -63,59 +96,76 @@ class EvaluationRepository:
         return None
     
     @staticmethod
-    async def get_evaluations_by_user_id(db: AsyncWsSurrealConnection, user: RecordID) -> Optional[List[EvaluationModel]]:
-        result: Optional[List[dict]] = await db.query(  # type: ignore
-            "SELECT * FROM evaluation WHERE user = $user",
-            {"user": user}
+    async def to_display_many(
+        db: AsyncWsSurrealConnection,
+        evaluation_models: List[EvaluationModel],
+        loaders: Optional[Loaders] = None,
+    ) -> List[Evaluation]:
+        evaluations = [e.to_raw() for e in evaluation_models]
+        if not evaluations:
+            return []
+
+        loaders = loaders or Loaders(db)
+        accounts, classes = await asyncio.gather(
+            loaders.account_by_id.load_many([e.user for e in evaluations]),
+            loaders.class_by_id.load_many([e.cls for e in evaluations]),
         )
 
-        if result is None:
-            return None
-        elif type(result) == dict:
-            return [EvaluationModel(**result)]
-        elif type(result) == list:
-            return [EvaluationModel(**item) for item in result]
-        
-        return None
-    
+        for evaluation in evaluations:
+            account = accounts.get(evaluation.user)
+            if account is not None:
+                evaluation.user = account.username
+
+            cls = classes.get(evaluation.cls)
+            if cls is not None:
+                evaluation.cls = cls.name
+
+        return evaluations
+
     @staticmethod
-    async def to_display(db: AsyncWsSurrealConnection, evaluation_model: EvaluationModel) -> Evaluation:
-        evaluation = evaluation_model.to_raw()
-        
-        account = await AccountRepository.get_account_by_id(db, evaluation.user)
-        if account is not None:
-            evaluation.user = account.username
-            
-        cls = await ClassRepository.get_class_by_id(db, evaluation.cls)
+    async def get_rows(
+        db: AsyncWsSurrealConnection,
+        limit: int,
+        after: Optional[str] = None,
+        user: Optional[RecordID] = None,
+        cls: Optional[RecordID] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        conditions = []
+        if user is not None:
+            conditions.append("user = $user")
         if cls is not None:
-            evaluation.cls = cls.name
+            conditions.append("cls = $cls")
+        query, params = keyset("evaluation", conditions, limit, after)
+        result: Optional[List[dict]] = await db.query(query, {"user": user, "cls": cls, **params})  # type: ignore
 
-        return evaluation
+        return split_page(result, limit)
 
     @staticmethod
-    async def get_evaluations_by_cls_id(db: AsyncWsSurrealConnection, cls: RecordID) -> Optional[List[EvaluationModel]]:
-        result: Optional[List[dict]] = await db.query(  # type: ignore
-            "SELECT * FROM evaluation WHERE cls = $cls",
-            {"cls": cls}
+    async def to_rows(
+        db: AsyncWsSurrealConnection, rows: List[dict], loaders: Optional[Loaders] = None
+    ) -> List[EvaluationRow]:
+        if not rows:
+            return []
+
+        loaders = loaders or Loaders(db)
+        accounts, classes = await asyncio.gather(
+            loaders.account_by_id.load_many(list({str(row["user"].id) for row in rows})),
+            loaders.class_by_id.load_many(list({str(row["cls"].id) for row in rows})),
         )
+        usernames = {id: account.username for id, account in accounts.items()}
+        class_names = {id: cls.name for id, cls in classes.items()}
+        return [EvaluationRow.from_row(row, usernames, class_names) for row in rows]
 
-        if result is None:
-            return None
-        elif type(result) == dict:
-            return [EvaluationModel(**result)]
-        elif type(result) == list:
-            return [EvaluationModel(**item) for item in result]
-        
-        return None
-    
     @staticmethod
-    async def evaluation_exists(db: AsyncWsSurrealConnection, user: RecordID, cls: RecordID) -> bool:
-        result = await db.query(
-            "SELECT * FROM evaluation WHERE user = $user AND cls = $cls",
-            {"user": user, "cls": cls}
-        )
-        return result is not None and len(result) > 0
-    
+    async def iter_row_batches(db: AsyncWsSurrealConnection, batch_size: int) -> AsyncIterator[List[EvaluationRow]]:
+        after: Optional[str] = None
+        while True:
+            rows, after = await EvaluationRepository.get_rows(db, batch_size, after)
+            if rows:
+                yield await EvaluationRepository.to_rows(db, rows)
+            if after is None:
+                break
+
     @staticmethod
     async def get_evaluation_by_id(db: AsyncWsSurrealConnection, id: str) -> Optional[EvaluationModel]:
         evaluation_model = await db.select(
@@ -0,0 +1,57 @@
+from typing import Dict, List
+
+from fastapi import Request
+from surrealdb import AsyncWsSurrealConnection
+from app.db import db
+from app.models.account import AccountModel
+from app.models.cls import Class
+from app.repositories.account import AccountRepository
+from app.repositories.cls import ClassRepository
+from app.utils.loader import Loader
+
+
+class Loaders:
+    # Identity map for one request: every account and class is fetched at most
+    # once, and lookups made concurrently share one query. Records loaded by
+    # name are also primed under their id and vice versa.
+    def __init__(self, db: AsyncWsSurrealConnection):
+        self.db = db
+        self.account_by_id: Loader[str, AccountModel] = Loader(self._accounts_by_ids)
+        self.account_by_name: Loader[str, AccountModel] = Loader(self._accounts_by_names)
+        self.class_by_id: Loader[str, Class] = Loader(self._classes_by_ids)
+        self.class_by_name: Loader[str, Class] = Loader(self._classes_by_names)
+
+    async def _accounts_by_ids(self, ids: List[str]) -> Dict[str, AccountModel]:
+        accounts = await AccountRepository.get_accounts_by_ids(self.db, ids)
+        for account in accounts.values():
+            self.account_by_name.prime(account.username, account)
+        return accounts
+
+    async def _accounts_by_names(self, names: List[str]) -> Dict[str, AccountModel]:
+        accounts = await AccountRepository.get_accounts_by_names(self.db, names)
+        for account in accounts.values():
+            if account.id is not None:
+                self.account_by_id.prime(str(account.id.id), account)
+        return accounts
+
+    async def _classes_by_ids(self, ids: List[str]) -> Dict[str, Class]:
+        classes = await ClassRepository.get_classes_by_ids(self.db, ids)
+        for cls in classes.values():
+            self.class_by_name.prime(cls.name, cls)
+        return classes
+
+    async def _classes_by_names(self, names: List[str]) -> Dict[str, Class]:
+        classes = await ClassRepository.get_classes_by_names(self.db, names)
+        for cls in classes.values():
+            if cls.id is not None:
+                self.class_by_id.prime(cls.id, cls)
+        return classes
+
+
+def get_loaders(request: Request) -> Loaders:
+    # Kept on the request state, so the loaders and everything they cached go
+    # away with the request.
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = request.state.loaders = Loaders(db)
+    return loaders
@@ -0,0 +1,371 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import contextlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from surrealdb import AsyncWsSurrealConnection, RecordID
+from app.config import EXPORT_BATCH_SIZE, SNAPSHOT_PATH, SNAPSHOT_REFRESH_INTERVAL
+from app.models.evaluation import CrossTabStats
+from app.utils.pagination import keyset, split_page
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+MAGIC = b"TALSNAP1"
+PERCENTILES = (25, 50, 75, 90)
+
+
+class Interner:
+    # Maps record ids to dense indexes so columns can store small integers.
+    def __init__(self, keys: Iterable[str] = ()):
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+        for key in keys:
+            self.intern(key)
+
+    def intern(self, key: str) -> int:
+        index = self.index.get(key)
+        if index is None:
+            index = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class EvaluationSnapshot:
+    # Every evaluation as three parallel typed columns (class, user, score),
+    # plus per-class teacher and category columns, so analytics never touch
+    # the evaluation records themselves. Rows are removed by moving the last
+    # row into the hole, which keeps the columns dense.
+    def __init__(self):
+        self.loaded_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.classes = Interner()
+        self.users = Interner()
+        self.teachers = Interner()
+        self.categories = Interner()
+        self.class_teacher = array("I")
+        self.class_category = array("I")
+        self.evaluation_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.cls = array("I")
+        self.user = array("I")
+        self.score = array("B")
+
+    def __len__(self) -> int:
+        return len(self.evaluation_ids)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    def set_class(self, cls: str, teacher: str, category: str) -> None:
+        index = self.classes.intern(cls)
+        teacher_index = self.teachers.intern(teacher)
+        category_index = self.categories.intern(category)
+        if index == len(self.class_teacher):
+            self.class_teacher.append(teacher_index)
+            self.class_category.append(category_index)
+        else:
+            self.class_teacher[index] = teacher_index
+            self.class_category[index] = category_index
+
+    def add(self, id: str, user: str, cls: str, score: int) -> None:
+        if id in self.positions or cls not in self.classes.index:
+            return
+        self.positions[id] = len(self.evaluation_ids)
+        self.evaluation_ids.append(id)
+        self.cls.append(self.classes.index[cls])
+        self.user.append(self.users.intern(user))
+        self.score.append(score)
+
+    def remove(self, id: str) -> None:
+        position = self.positions.pop(id, None)
+        if position is None:
+            return
+        last = len(self.evaluation_ids) - 1
+        if position != last:
+            moved = self.evaluation_ids[last]
+            self.evaluation_ids[position] = moved
+            self.positions[moved] = position
+            self.cls[position] = self.cls[last]
+            self.user[position] = self.user[last]
+            self.score[position] = self.score[last]
+        self.evaluation_ids.pop()
+        self.cls.pop()
+        self.user.pop()
+        self.score.pop()
+
+    def remove_class(self, cls: str) -> None:
+        index = self.classes.index.get(cls)
+        if index is None:
+            return
+        for position in reversed(range(len(self.cls))):
+            if self.cls[position] == index:
+                self.remove(self.evaluation_ids[position])
+
+    def distribution(
+        self, teacher: Optional[str] = None, category: Optional[str] = None
+    ) -> Dict[Tuple[int, int], List[int]]:
+        # (category index, teacher index) -> number of 1..5 scores.
+        teacher_index = self.teachers.index.get(teacher, -1) if teacher is not None else None
+        category_index = self.categories.index.get(category, -1) if category is not None else None
+        n_teachers = max(len(self.teachers), 1)
+
+        if np is not None:
+            cls = np.frombuffer(self.cls, dtype=np.uint32)
+            score = np.frombuffer(self.score, dtype=np.uint8)
+            class_teacher = np.frombuffer(self.class_teacher, dtype=np.uint32)
+            class_category = np.frombuffer(self.class_category, dtype=np.uint32)
+            row_teacher = class_teacher[cls].astype(np.int64)
+            row_category = class_category[cls].astype(np.int64)
+            mask = np.ones(len(cls), dtype=bool)
+            if teacher_index is not None:
+                mask &= row_teacher == teacher_index
+            if category_index is not None:
+                mask &= row_category == category_index
+            groups = (row_category[mask] * n_teachers + row_teacher[mask]) * 5 + (score[mask].astype(np.int64) - 1)
+            counts = np.bincount(groups, minlength=len(self.categories) * n_teachers * 5).reshape(-1, 5)
+            return {
+                (int(key) // n_teachers, int(key) % n_teachers): counts[key].tolist()
+                for key in np.flatnonzero(counts.sum(axis=1))
+            }
+
+        result: Dict[Tuple[int, int], List[int]] = {}
+        class_teacher = self.class_teacher
+        class_category = self.class_category
+        for cls, score in zip(self.cls, self.score):
+            row_teacher = class_teacher[cls]
+            row_category = class_category[cls]
+            if teacher_index is not None and row_teacher != teacher_index:
+                continue
+            if category_index is not None and row_category != category_index:
+                continue
+            key = (row_category, row_teacher)
+            counts = result.get(key)
+            if counts is None:
+                counts = result[key] = [0, 0, 0, 0, 0]
+            counts[score - 1] += 1
+        return result
+
+    def crosstab(self, teacher: Optional[str] = None, category: Optional[str] = None) -> List[CrossTabStats]:
+        result = []
+        for (category_index, teacher_index), counts in self.distribution(teacher, category).items():
+            result.append(
+                summarize(counts, self.categories.keys[category_index], self.teachers.keys[teacher_index])
+            )
+        result.sort(key=lambda s: (s.category, s.teacher_id))
+        return result
+
+    def state(self) -> Tuple[dict, bytes]:
+        # A consistent copy that `write` can serialize off the event loop
+        # while this snapshot keeps taking updates.
+        header = {
+            "loaded_at": self.loaded_at,
+            "classes": list(self.classes.keys),
+            "users": list(self.users.keys),
+            "teachers": list(self.teachers.keys),
+            "categories": list(self.categories.keys),
+            "class_teacher": self.class_teacher.tolist(),
+            "class_category": self.class_category.tolist(),
+            "evaluations": list(self.evaluation_ids),
+        }
+        return header, self.cls.tobytes() + self.user.tobytes() + self.score.tobytes()
+
+    @staticmethod
+    def write(path: str, header: dict, columns: bytes) -> None:
+        # Worker processes may share the path, so each writes its own
+        # temporary file and the last complete one wins.
+        encoded = json.dumps(header).encode()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<Q", len(encoded)))
+                f.write(encoded)
+                f.write(columns)
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+
+    def restore(self, path: str) -> bool:
+        # The columns are mapped rather than read into intermediate buffers;
+        # they are still copied into arrays because the snapshot keeps growing.
+        # Anything that does not add up exactly is rejected and leaves this
+        # snapshot untouched, so the caller reloads from the database instead.
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offset = len(MAGIC) + 8
+                if len(mm) < offset or mm[: len(MAGIC)] != MAGIC:
+                    return False
+                (header_size,) = struct.unpack_from("<Q", mm, len(MAGIC))
+                if offset + header_size > len(mm):
+                    return False
+                header = json.loads(mm[offset : offset + header_size])
+                offset += header_size
+
+                evaluation_ids: List[str] = header["evaluations"]
+                classes = Interner(header["classes"])
+                users = Interner(header["users"])
+                teachers = Interner(header["teachers"])
+                categories = Interner(header["categories"])
+                class_teacher = array("I", header["class_teacher"])
+                class_category = array("I", header["class_category"])
+                loaded_at = float(header["loaded_at"])
+                count = len(evaluation_ids)
+                cls, user, score = columns = (array("I"), array("I"), array("B"))
+                if len(mm) - offset != count * sum(column.itemsize for column in columns):
+                    return False
+                for column in columns:
+                    size = count * column.itemsize
+                    column.frombytes(mm[offset : offset + size])
+                    offset += size
+
+                positions = {id: position for position, id in enumerate(evaluation_ids)}
+                if (
+                    len(positions) != count
+                    or len(class_teacher) != len(classes)
+                    or len(class_category) != len(classes)
+                    or not below(class_teacher, len(teachers))
+                    or not below(class_category, len(categories))
+                    or not below(cls, len(classes))
+                    or not below(user, len(users))
+                    or (count and (min(score) < 1 or max(score) > 5))
+                ):
+                    return False
+
+                self.reset()
+                self.classes = classes
+                self.users = users
+                self.teachers = teachers
+                self.categories = categories
+                self.class_teacher = class_teacher
+                self.class_category = class_category
+                self.evaluation_ids = evaluation_ids
+                self.positions = positions
+                self.cls, self.user, self.score = columns
+                self.loaded_at = loaded_at
+        except (OSError, ValueError, KeyError, TypeError, OverflowError, struct.error):
+            return False
+        return True
+
+
+def below(column: array, limit: int) -> bool:
+    return not column or max(column) < limit
+
+
+def summarize(counts: List[int], category: str, teacher: str) -> CrossTabStats:
+    total = sum(counts)
+    mean = sum(score * n for score, n in enumerate(counts, start=1)) / total
+    variance = sum(n * (score - mean) ** 2 for score, n in enumerate(counts, start=1)) / total
+
+    # Scores are 1..5, so nearest-rank percentiles fall out of the running
+    # totals of the distribution without sorting anything.
+    percentiles = {}
+    for p in PERCENTILES:
+        rank = max(math.ceil(p / 100 * total), 1)
+        running = 0
+        for score, n in enumerate(counts, start=1):
+            running += n
+            if running >= rank:
+                percentiles[f"p{p}"] = score
+                break
+
+    return CrossTabStats(
+        category=category,
+        teacher_id=teacher,
+        count=total,
+        average=round(mean, 2),
+        std=round(math.sqrt(variance), 4),
+        distribution={str(score): n for score, n in enumerate(counts, start=1)},
+        **percentiles,
+    )
+
+
+def teacher_key(teacher: Optional[RecordID]) -> str:
+    # Classes whose teacher was never set are grouped under an empty teacher,
+    # the same way a missing category is.
+    return str(teacher.id) if teacher is not None else ""
+
+
+evaluation_snapshot = EvaluationSnapshot()
+
+
+class SnapshotRepository:
+    @staticmethod
+    async def load(db: AsyncWsSurrealConnection, snapshot: EvaluationSnapshot = evaluation_snapshot) -> None:
+        loaded_at = time.time()
+        classes: List[dict] = await db.query("SELECT id, teacher, category FROM class")  # type: ignore
+
+        snapshot.reset()
+        for cls in classes or []:
+            snapshot.set_class(str(cls["id"].id), teacher_key(cls.get("teacher")), cls.get("category") or "")
+
+        after: Optional[str] = None
+        while True:
+            query, params = keyset("evaluation", [], EXPORT_BATCH_SIZE, after, fields="id, user, cls, score")
+            rows, after = split_page(await db.query(query, params), EXPORT_BATCH_SIZE)  # type: ignore
+            for row in rows:
+                snapshot.add(str(row["id"].id), str(row["user"].id), str(row["cls"].id), row["score"])
+            if after is None:
+                break
+        snapshot.loaded_at = loaded_at
+
+        if SNAPSHOT_PATH:
+            await asyncio.to_thread(EvaluationSnapshot.write, SNAPSHOT_PATH, *snapshot.state())
+
+    @staticmethod
+    async def ensure_loaded(
+        db: AsyncWsSurrealConnection, snapshot: EvaluationSnapshot = evaluation_snapshot
+    ) -> EvaluationSnapshot:
+        # Only this process's writes are applied incrementally, so the snapshot
+        # is rebuilt every SNAPSHOT_REFRESH_INTERVAL to pick up the others'.
+        async with snapshot.lock:
+            if not snapshot.loaded and SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+                snapshot.restore(SNAPSHOT_PATH)
+            if not snapshot.loaded or time.time() - snapshot.loaded_at > SNAPSHOT_REFRESH_INTERVAL:  # type: ignore
+                await SnapshotRepository.load(db, snapshot)
+        return snapshot
+
+    @staticmethod
+    def record_evaluation(id: RecordID, user: RecordID, cls: RecordID, score: int) -> None:
+        if evaluation_snapshot.loaded:
+            evaluation_snapshot.add(str(id.id), str(user.id), str(cls.id), score)
+
+    @staticmethod
+    def remove_evaluation(id: RecordID) -> None:
+        if evaluation_snapshot.loaded:
+            evaluation_snapshot.remove(str(id.id))
+
+    @staticmethod
+    def record_class(class_id: RecordID, teacher: Optional[RecordID], category: str) -> None:
+        if evaluation_snapshot.loaded:
+            evaluation_snapshot.set_class(str(class_id.id), teacher_key(teacher), category)
+
+    @staticmethod
+    def remove_class_evaluations(class_id: RecordID) -> None:
+        if evaluation_snapshot.loaded:
+            evaluation_snapshot.remove_class(str(class_id.id))
+
+    @staticmethod
+    def invalidate() -> None:
+        evaluation_snapshot.invalidate()
@@ -0,0 +1,232 @@
+from typing import Dict, List, Optional
+
+from surrealdb import AsyncWsSurrealConnection, RecordID
+from app.config import RANKING_PRIOR_MEAN, RANKING_PRIOR_WEIGHT
+from app.db import query_all, run_transaction
+from app.models.evaluation import ClassStatsModel, EvaluationStats, TeacherRanking
+from app.repositories.cache import repository_cache
+from app.repositories.snapshot import SnapshotRepository
+
+GROUP_EVALUATIONS_BY_CLASS = """
+SELECT
+    cls,
+    count() AS count,
+    math::sum(score) AS sum,
+    count(score = 1) AS s1,
+    count(score = 2) AS s2,
+    count(score = 3) AS s3,
+    count(score = 4) AS s4,
+    count(score = 5) AS s5
+FROM evaluation {where} GROUP BY cls
+"""
+
+# Bayesian average: every teacher starts with `$prior_weight` virtual
+# evaluations of `$prior_mean`, so a handful of perfect scores cannot
+# outrank a long, consistently good record.
+RESCORE_TEACHER = "UPDATE {target} SET score = ($prior_weight * $prior_mean + sum) / ($prior_weight + count)"
+
+# Expects `$row` to be one row of GROUP_EVALUATIONS_BY_CLASS.
+CREATE_CLASS_STATS = """
+CREATE type::thing("class_stats", record::id($row.cls)) CONTENT {
+    cls: $row.cls,
+    teacher: $row.cls.teacher,
+    count: $row.count,
+    sum: $row.sum,
+    distribution: { "1": $row.s1, "2": $row.s2, "3": $row.s3, "4": $row.s4, "5": $row.s5 },
+}
+"""
+
+# Recomputes every class's and teacher's stats from the evaluations; expects
+# the ranking prior to be bound. Shared by `rebuild` and migration 3.
+REBUILD_STATS = f"""
+DELETE class_stats;
+FOR $row IN ({GROUP_EVALUATIONS_BY_CLASS.format(where="")}) {{
+    {CREATE_CLASS_STATS};
+}};
+DELETE teacher_stats;
+FOR $row IN (
+    SELECT teacher, math::sum(count) AS count, math::sum(sum) AS sum
+    FROM class_stats WHERE teacher != NONE GROUP BY teacher
+) {{
+    CREATE type::thing("teacher_stats", record::id($row.teacher)) CONTENT {{
+        teacher: $row.teacher,
+        count: $row.count,
+        sum: $row.sum,
+    }};
+}};
+{RESCORE_TEACHER.format(target="teacher_stats")};
+"""
+
+
+class StatsRepository:
+    @staticmethod
+    def stats_id(class_id: RecordID) -> RecordID:
+        return RecordID("class_stats", class_id.id)
+
+    @staticmethod
+    def prior() -> Dict[str, float]:
+        return {"prior_mean": RANKING_PRIOR_MEAN, "prior_weight": RANKING_PRIOR_WEIGHT}
+
+    @staticmethod
+    def version(class_id: RecordID) -> str:
+        table_version, class_version = repository_cache.key_version("class_stats", str(class_id.id))
+        return f"{table_version}.{class_version}"
+
+    @staticmethod
+    def changed(class_id: RecordID) -> None:
+        repository_cache.bump_key("class_stats", str(class_id.id))
+
+    @staticmethod
+    def score_statements(score: int) -> str:
+        # Statements that apply `$delta` evaluations of `score` to the stats of
+        # `$cls`; they expect `$cls`, `$delta`, `$points` and the prior to be
+        # bound and are meant to run inside the caller's transaction. `score`
+        # is always a clamped int, so it is safe to inline as a field name.
+        score = min(max(int(score), 1), 5)
+        return f"""
+            LET $teacher = $cls.teacher;
+            LET $stats = type::thing("class_stats", record::id($cls));
+            UPSERT $stats SET cls = $cls, teacher = $teacher, count += $delta, sum += $points, distribution.`{score}` += $delta;
+            IF $teacher != NONE {{
+                LET $teacher_stats = type::thing("teacher_stats", record::id($teacher));
+                UPSERT $teacher_stats SET teacher = $teacher, count += $delta, sum += $points;
+                {RESCORE_TEACHER.format(target="$teacher_stats")};
+            }};
+        """
+
+    @staticmethod
+    def recompute_statements() -> str:
+        # Statements that recompute the stats of every class in `$classes`
+        # from its evaluations and the totals of every teacher in `$teachers`
+        # from their classes' stats; stats of classes without evaluations and
+        # teachers without classes are dropped. Meant to run at the end of the
+        # caller's transaction, once its evaluations and classes are gone.
+        return f"""
+            LET $grouped = ({GROUP_EVALUATIONS_BY_CLASS.format(where="WHERE cls IN $classes")});
+            FOR $class IN $classes {{
+                DELETE type::thing("class_stats", record::id($class));
+            }};
+            FOR $row IN $grouped {{
+                {CREATE_CLASS_STATS};
+            }};
+            FOR $teacher IN $teachers {{
+                LET $teacher_stats = type::thing("teacher_stats", record::id($teacher));
+                LET $totals = (
+                    SELECT math::sum(count) AS count, math::sum(sum) AS sum
+                    FROM class_stats WHERE teacher = $teacher GROUP ALL
+                )[0];
+                IF $totals = NONE OR $totals.count = 0 {{
+                    DELETE $teacher_stats;
+                }} ELSE {{
+                    UPSERT $teacher_stats SET teacher = $teacher, count = $totals.count, sum = $totals.sum;
+                    {RESCORE_TEACHER.format(target="$teacher_stats")};
+                }};
+            }};
+        """
+
+    @staticmethod
+    async def get_class_stats(db: AsyncWsSurrealConnection, cls: RecordID) -> Optional[ClassStatsModel]:
+        result: List[dict] = await db.query(  # type: ignore
+            "SELECT *, cls.name AS class_name FROM $stats",
+            {"stats": StatsRepository.stats_id(cls)},
+        )
+        if not result:
+            return None
+        return ClassStatsModel(**result[0])
+
+    @staticmethod
+    async def compute_all(db: AsyncWsSurrealConnection) -> Dict[str, ClassStatsModel]:
+        rows: List[dict] = await db.query(GROUP_EVALUATIONS_BY_CLASS.format(where=""))  # type: ignore
+        return StatsRepository.from_grouped_rows(rows or [])
+
+    @staticmethod
+    def from_grouped_rows(rows: List[dict]) -> Dict[str, ClassStatsModel]:
+        result: Dict[str, ClassStatsModel] = {}
+        for row in rows:
+            stats = ClassStatsModel(
+                cls=row["cls"],
+                count=row["count"],
+                sum=row["sum"],
+                distribution={str(i): row[f"s{i}"] for i in range(1, 6)},
+            )
+            result[str(stats.cls.id)] = stats
+        return result
+
+    @staticmethod
+    async def compute_by_class(
+        db: AsyncWsSurrealConnection,
+        teacher: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[EvaluationStats]:
+        conditions = []
+        if teacher is not None:
+            conditions.append("teacher IN (SELECT VALUE id FROM account WHERE username = $teacher)")
+        if category is not None:
+            conditions.append("category = $category")
+        class_filter = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        evaluation_filter = "WHERE cls IN $classes.id" if conditions else ""
+
+        results = await query_all(
+            db,
+            f"""
+            LET $classes = (SELECT id, name FROM class {class_filter});
+            LET $stats = ({GROUP_EVALUATIONS_BY_CLASS.format(where=evaluation_filter)});
+            RETURN [$classes, $stats];
+            """,
+            {"teacher": teacher, "category": category},
+        )
+        classes, rows = results[-1]
+
+        grouped = StatsRepository.from_grouped_rows(rows or [])
+        result: List[EvaluationStats] = []
+        for cls in sorted(classes or [], key=lambda c: c["name"]):
+            stats = grouped.get(str(cls["id"].id)) or ClassStatsModel(cls=cls["id"])
+            result.append(stats.to_stats(cls["name"]))
+        return result
+
+    @staticmethod
+    async def get_all(db: AsyncWsSurrealConnection) -> Dict[str, ClassStatsModel]:
+        rows: List[dict] = await db.query("SELECT * FROM class_stats")  # type: ignore
+        result: Dict[str, ClassStatsModel] = {}
+        for row in rows or []:
+            stats = ClassStatsModel(**row)
+            result[str(stats.cls.id)] = stats
+        return result
+
+    @staticmethod
+    async def get_teacher_ranking(db: AsyncWsSurrealConnection, limit: int = 10) -> List[TeacherRanking]:
+        rows: List[dict] = await db.query(  # type: ignore
+            """
+            SELECT teacher, teacher.username AS teacher_name, count, sum, score
+            FROM teacher_stats WHERE count > 0
+            ORDER BY score DESC LIMIT $limit
+            """,
+            {"limit": limit},
+        )
+        return [
+            TeacherRanking(
+                rank=rank,
+                teacher_id=str(row["teacher"].id),
+                teacher_name=row.get("teacher_name"),
+                count=row["count"],
+                average=round(row["sum"] / row["count"], 2),
+                score=round(row["score"], 4),
+            )
+            for rank, row in enumerate(rows or [], start=1)
+        ]
+
+    @staticmethod
+    async def rebuild(db: AsyncWsSurrealConnection) -> int:
+        results = await run_transaction(
+            db,
+            f"""
+            BEGIN TRANSACTION;
+            {REBUILD_STATS}
+            RETURN count(SELECT id FROM class_stats);
+            COMMIT TRANSACTION;
+            """,
+            StatsRepository.prior(),
+        )
+        repository_cache.bump("class_stats")
+        SnapshotRepository.invalidate()
+        return results[-1] or 0
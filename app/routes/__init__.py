@@ -1,5 +1,7 @@
 from .account import router as account
+from .admin import router as admin
 from .cls import router as cls
 from .evaluation import router as evaluation
+from .job import router as job
 
-__all__ = ["account", "cls", "evaluation"]
+__all__ = ["account", "admin", "cls", "evaluation", "job"]
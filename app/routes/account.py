@@ -1,14 +1,20 @@
-from typing import Optional, List
-from fastapi import APIRouter, Request
-from argon2.exceptions import VerifyMismatchError
-from app.db import db
+from typing import Optional, List, Union
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import ORJSONResponse
+from app.db import QueryError, db
 from app.models import Response
 from app.models.account import Account, Credentials, LoginResponse, UpdateAccount, AccountResponse, ChangePassword, AccountModel
+from app.models.job import JobStatus
 from app.repositories.account import AccountRepository
+from app.repositories.loader import Loaders, get_loaders
+from app.utils.auth import AuthRoute, get_current_account
+from app.utils.jobs import jobs
+from app.utils.pagination import page_limit
+from app.utils.response import fast_response
+from app.utils.password import hash_password, verify_password
+from app.utils.token import new_token
 
-import argon2
-
-router = APIRouter()
+router = APIRouter(route_class=AuthRoute)
 
 
 @router.post("/register")
@@ -18,39 +24,31 @@ async def register(account: Account) -> Response[None]:
     else:
         if len(account.password) < 8:
             return Response("Password must be at least 8 characters long.", data=None, success=False)
-        account.password = argon2.hash_password(
-            account.password.encode(), salt=account.username.encode()
-        ).decode()
-        account_data = account.model_dump(exclude={"id"})
-        await db.create("account", account_data)
+        account.password = await hash_password(account.password, salt=account.username)
+        try:
+            await AccountRepository.create_account(db, account)
+        except QueryError as e:
+            # Another registration took the name between the check and here.
+            if AccountRepository.is_duplicate(e):
+                return Response("Account already exists.", data=None, success=False)
+            raise
 
     return Response("Account created successfully.")
 
 
 @router.post("/login")
 async def login(credentials: Credentials) -> Response[Optional[LoginResponse]]:
-    account = await AccountRepository.get_account_by_name(db, credentials.username)
+    account = await AccountRepository.get_account_by_name(db, credentials.username, fresh=True)
 
     if account is None:
         return Response("Account not found.", data=None, success=False)
 
-    try:
-        if argon2.verify_password(
-            account.password.encode(), credentials.password.encode()
-        ):
-            await AccountRepository.delete_token(db, account.username)
-            token = argon2.hash_password(account.username.encode()).decode()
-            await db.create(
-                "auth",
-                {
-                    "username": account.username,
-                    "token": token,
-                },
-            )
-            return Response("Login successful.", data=LoginResponse(token=token))
-        else:
-            return Response("Invalid password.", data=None, success=False)
-    except VerifyMismatchError:
+    if await verify_password(account.password, credentials.password):
+        await AccountRepository.delete_token(db, account.username)
+        token = new_token()
+        await AccountRepository.create_token(db, account, token)
+        return Response("Login successful.", data=LoginResponse(token=token))
+    else:
         return Response("Invalid password.", data=None, success=False)
 
 
@@ -62,37 +60,29 @@ async def logout(request: Request) -> Response[None]:
 
 
 @router.post("/change-password")
-async def change_password(change_password: ChangePassword, request: Request) -> Response[None]:
-    auth = request.state.auth
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-    if account is None or account.id is None:
-        return Response("Account not found.", data=None, success=False)
-    
+async def change_password(
+    change_password: ChangePassword, account: AccountModel = Depends(get_current_account)
+) -> Response[None]:
     if len(change_password.newpassword) < 8:
         return Response("Password must be at least 8 characters long.", data=None, success=False)
         
-    try:
-        if argon2.verify_password(account.password.encode(), change_password.oldpassword.encode()):
-            await AccountRepository.delete_token(db, account.username)
-            account.password = argon2.hash_password(
-                change_password.newpassword.encode(), salt=account.username.encode()
-            ).decode()
-            await db.update(account.id, account.model_dump())
-            return Response("Password changed successfully.")
-        else:
-            return Response("Invalid old password.", data=None, success=False)
-    except VerifyMismatchError:
+    stored = await AccountRepository.get_account_by_name(db, account.username, fresh=True)
+    if stored is None:
+        return Response("Account not found.", data=None, success=False)
+
+    if await verify_password(stored.password, change_password.oldpassword):
+        await AccountRepository.delete_token(db, account.username)
+        password = await hash_password(change_password.newpassword, salt=account.username)
+        await AccountRepository.update_account(db, account, {"password": password})
+        return Response("Password changed successfully.")
+    else:
         return Response("Invalid old password.", data=None, success=False)
 
 
 @router.patch("")
-async def update_account(update_data: UpdateAccount, request: Request) -> Response[None]:
-    auth = request.state.auth
-
-    current_user = await AccountRepository.get_account_by_name(db, auth.username)
-    if current_user is None:
-        return Response("Current user account not found.", data=None, success=False)
-    
+async def update_account(
+    update_data: UpdateAccount, current_user: AccountModel = Depends(get_current_account)
+) -> Response[None]:
     target_account = await AccountRepository.get_account_by_name(db, update_data.username)
 
     if target_account is None or target_account.id is None:
@@ -101,40 +91,49 @@ async def update_account(update_data: UpdateAccount, request: Request) -> Respon
     if update_data.type is not None and current_user.type != "admin":
         return Response("Permission denied. Only admin can modify account type.", data=None, success=False)
 
-    if auth.username != update_data.username and current_user.type != "admin":
+    if current_user.username != update_data.username and current_user.type != "admin":
         return Response(
             "Permission denied. Only admin can update other accounts.", data=None, success=False
         )
     
-    old_name = target_account.username
-
+    changes = {}
     if update_data.newname is not None:
-        target_account.username = update_data.newname
-        await AccountRepository.delete_token(db, old_name)
+        changes["username"] = update_data.newname
     if update_data.email is not None:
-        target_account.email = update_data.email
+        changes["email"] = update_data.email
     if update_data.phone is not None:
-        target_account.phone = update_data.phone
+        changes["phone"] = update_data.phone
     if update_data.type is not None:
-        target_account.type = update_data.type
+        changes["type"] = update_data.type
     
-    await db.update(target_account.id, target_account.model_dump())
+    try:
+        await AccountRepository.update_account(db, target_account, changes)
+    except QueryError as e:
+        if AccountRepository.is_duplicate(e):
+            return Response("Account already exists.", data=None, success=False)
+        raise
+    if update_data.newname is not None:
+        await AccountRepository.delete_token(db, target_account.username)
     return Response("Account updated successfully.")
 
 
 @router.delete("")
-async def delete_account_by_username(username: str, request: Request) -> Response[None]:
-    auth = request.state.auth
-
-    current_user = await AccountRepository.get_account_by_name(db, auth.username)
-    if current_user is None:
-        return Response("Current user account not found.", data=None, success=False)
-    
-    if auth.username != username and current_user.type != "admin":
+async def delete_account_by_username(
+    username: str, background: bool = False, current_user: AccountModel = Depends(get_current_account)
+) -> Response[Optional[JobStatus]]:
+    if current_user.username != username and current_user.type != "admin":
         return Response(
             "Permission denied. Only admin can delete other accounts.", data=None, success=False
         )
 
+    if background:
+        if await AccountRepository.get_account_by_name(db, username) is None:
+            return Response("Failed to delete account.", data=None, success=False)
+        job = jobs.submit(
+            "delete_account", current_user.username, lambda: AccountRepository.delete_account(db, username)
+        )
+        return Response("Account deletion scheduled.", data=job)
+
     if not await AccountRepository.delete_account(db, username):
         return Response("Failed to delete account.", data=None, success=False)
 
@@ -142,32 +141,29 @@ async def delete_account_by_username(username: str, request: Request) -> Respons
 
 
 @router.get("")
-async def get_account(name: str, request: Request) -> Response[Optional[AccountResponse]]:
-    auth = request.state.auth
-    
-    current_user = await AccountRepository.get_account_by_name(db, auth.username)
-    if current_user is None:
-        return Response("Current user not found.", data=None, success=False) 
-    
-    account = await AccountRepository.get_account_by_name(db, name)
+async def get_account(
+    name: str,
+    current_user: AccountModel = Depends(get_current_account),
+    loaders: Loaders = Depends(get_loaders),
+) -> Response[Optional[AccountResponse]]:
+    account = await loaders.account_by_name.load(name)
     
     if account is None or account.id is None:
         return Response("Account not found.", data=None, success=False)
-    elif current_user.type != "admin" and auth.username != name:
+    elif current_user.type != "admin" and current_user.username != name:
         return Response("Permission denied. You can only access the user ID.", data=account.to_response().retain_id_only(), success=True)
     else:
         return Response("Account found.", data=account.to_response())
 
 
-@router.get("/users")
-async def get_users(request: Request) -> Response[List[AccountResponse]]:
-    auth = request.state.auth
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-
-    if account is None:
-        return Response("Account not found.", data=None, success=False)
-    
+@router.get("/users", response_model=Response[List[AccountResponse]])
+async def get_users(
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    account: AccountModel = Depends(get_current_account),
+) -> Union[ORJSONResponse, Response[List[AccountResponse]]]:
     if account.type != "admin":
         return Response("Permission denied. Only admin can access this resource.", data=None, success=False)
     
-    return Response("Users found.", data=[account.to_response() for account in await AccountRepository.get_non_admin_accounts(db)])
\ No newline at end of file
+    rows, next_cursor = await AccountRepository.get_non_admin_accounts(db, page_limit(limit), after)
+    return fast_response("Users found.", data=rows, next_cursor=next_cursor)
\ No newline at end of file
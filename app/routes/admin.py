@@ -0,0 +1,31 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends
+
+from app.models import Response
+from app.models.account import AccountModel
+from app.models.query import QueryStat
+from app.utils.auth import AuthRoute, get_current_account
+from app.utils.querylog import query_log
+router = APIRouter(route_class=AuthRoute)
+
+
+@router.get("/queries")
+async def get_query_stats(
+    limit: int = 20,
+    order: Literal["total_seconds", "max_seconds", "calls"] = "total_seconds",
+    account: AccountModel = Depends(get_current_account),
+) -> Response[Optional[List[QueryStat]]]:
+    if account.type != "admin":
+        return Response("Permission denied. Only admin can access this resource.", data=None, success=False)
+
+    limit = min(max(limit, 1), 100)
+    return Response("Query statistics retrieved successfully", data=query_log.top(limit, order))
+
+
+@router.delete("/queries")
+async def reset_query_stats(account: AccountModel = Depends(get_current_account)) -> Response[None]:
+    if account.type != "admin":
+        return Response("Permission denied. Only admin can access this resource.", data=None, success=False)
+
+    query_log.clear()
+    return Response("Query statistics reset successfully.")
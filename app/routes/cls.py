@@ -1,23 +1,26 @@
-from typing import Optional, List
-from surrealdb import RecordID
-from fastapi import APIRouter, Request, Depends
+from typing import Optional, List, Union
+from fastapi import APIRouter, Depends, Request, Response as HTTPResponse
 
 from app.db import db
 from app.models import Record, Response
 from app.models.cls import CreateClass, GetClass, UpdateClass, DeleteClass, DisplayClass
-from app.repositories.account import AccountRepository
+from app.repositories.cache import repository_cache
 from app.repositories.cls import ClassRepository
-from app.repositories.evaluation import EvaluationRepository
-router = APIRouter()
+from app.repositories.loader import Loaders, get_loaders
+from app.models.account import AccountModel
+from app.models.job import JobStatus
+from app.utils.auth import AuthRoute, get_current_account
+from app.utils.etag import make_etag, not_modified
+from app.utils.jobs import jobs
+from app.utils.pagination import page_limit
+from app.utils.response import fast_response
+router = APIRouter(route_class=AuthRoute)
 
 
 @router.put("")
-async def create_class(cls_dto: CreateClass, request: Request) -> Response[Optional[Record]]:
-    auth = request.state.auth
-
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-    if account is None:
-        return Response("Account not found.", data=None, success=False)
+async def create_class(
+    cls_dto: CreateClass, account: AccountModel = Depends(get_current_account)
+) -> Response[Optional[Record]]:
     if account.type != "teacher" and account.type != "admin":
         return Response(
             "Only teacher or admin can create a new class.", data=None, success=False
@@ -36,8 +39,7 @@ async def create_class(cls_dto: CreateClass, request: Request) -> Response[Optio
     if await ClassRepository.class_exists(db, cls_dto.name):
         return Response("Class name already exists.", data=None, success=False)
 
-    cls_model_data = cls_dto.to_model(teacher_id).model_dump(exclude={"id"})
-    await db.create("class", cls_model_data)
+    await ClassRepository.create_class(db, cls_dto.to_model(teacher_id))
 
     return Response(
         "Class created successfully."
@@ -45,17 +47,15 @@ async def create_class(cls_dto: CreateClass, request: Request) -> Response[Optio
 
 
 @router.patch("")
-async def update_class(update_data: UpdateClass, request: Request) -> Response[None]:
-    auth = request.state.auth
-    
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-
-    if account is None:
-        return Response("Account not found.", data=None, success=False)
+async def update_class(
+    update_data: UpdateClass,
+    account: AccountModel = Depends(get_current_account),
+    loaders: Loaders = Depends(get_loaders),
+) -> Response[None]:
     if account.type != "teacher" and account.type != "admin":
         return Response("Only teacher or admin can update a class.", data=None, success=False)
 
-    cls = await ClassRepository.get_class_by_name(db, update_data.name)
+    cls = await loaders.class_by_name.load(update_data.name)
     if cls is None:
         return Response("Class not found.", data=None, success=False)
     
@@ -72,44 +72,40 @@ async def update_class(update_data: UpdateClass, request: Request) -> Response[N
         if update_data.teacher is not None:
             return Response("Teacher cannot change the class's teacher.", data=None, success=False)
 
+    changes = {}
     if update_data.newname is not None:
-        other_cls = await ClassRepository.get_class_by_name(db, update_data.newname)
+        other_cls = await loaders.class_by_name.load(update_data.newname)
         if other_cls is not None:
             return Response("Class name already exists.", data=None, success=False)
-        cls_model.name = update_data.newname
+        changes["name"] = update_data.newname
     if update_data.teacher is not None:
-        new_teacher = await AccountRepository.get_account_by_name(db, update_data.teacher)
+        new_teacher = await loaders.account_by_name.load(update_data.teacher)
         if new_teacher is None or new_teacher.id is None:
             return Response("Teacher not found.", data=None, success=False)
-        cls_model.teacher = new_teacher.id
+        changes["teacher"] = new_teacher.id
     if update_data.description is not None:
-        cls_model.description = update_data.description
+        changes["description"] = update_data.description
     if update_data.category is not None:
-        cls_model.category = update_data.category
+        changes["category"] = update_data.category
 
-    await db.update(
-        cls_model.id,
-        cls_model.model_dump(),
-    )
+    await ClassRepository.update_class(db, cls_model.id, changes)
     return Response("Class updated successfully.")
 
 
 @router.delete("")
-async def delete_class(request: Request, delete_data: DeleteClass = Depends()) -> Response[None]:
-    auth = request.state.auth
-    
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-
-    if account is None:
-        return Response("Account not found.", data=None, success=False)
-    
+async def delete_class(
+    delete_data: DeleteClass = Depends(),
+    background: bool = False,
+    account: AccountModel = Depends(get_current_account),
+    loaders: Loaders = Depends(get_loaders),
+) -> Response[Optional[JobStatus]]:
     if account.type != "teacher" and account.type != "admin":
         return Response("Only teacher or admin can delete a class.", data=None, success=False)
     
     if delete_data.name is not None:
-        cls_model = await ClassRepository.get_class_by_name(db, delete_data.name)
+        cls_model = await loaders.class_by_name.load(delete_data.name)
     elif delete_data.id is not None:
-        cls_model = await ClassRepository.get_class_by_id(db, delete_data.id)
+        cls_model = await loaders.class_by_id.load(delete_data.id)
     else:
         return Response("Class name or ID not found.", data=None, success=False)
 
@@ -122,32 +118,56 @@ async def delete_class(request: Request, delete_data: DeleteClass = Depends()) -
 
         if str(cls_model.teacher) != str(account.id.id):
             return Response("You can only delete your own class.", data=None, success=False)
-    
-    await EvaluationRepository.delete_evaluations_by_cls_id(db, RecordID("class", cls_model.id))
-    await ClassRepository.delete_class_by_id(db, cls_model.id)
+
+    class_id = cls_model.id
+    if background:
+        job = jobs.submit("delete_class", account.username, lambda: ClassRepository.delete_class_by_id(db, class_id))
+        return Response("Class deletion scheduled.", data=job)
+
+    await ClassRepository.delete_class_by_id(db, class_id)
     return Response("Class deleted successfully.")
 
 
-@router.get("")
-async def get_classes(get_class: GetClass = Depends()) -> Response[List[DisplayClass]]:
-    classes = None
+@router.get("", response_model=Response[List[DisplayClass]])
+async def get_classes(
+    request: Request,
+    response: HTTPResponse,
+    get_class: GetClass = Depends(),
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders),
+) -> Union[HTTPResponse, Response[List[DisplayClass]]]:
+    # Class lists show teacher names, so they change with either table.
+    etag = make_etag("class", repository_cache.version("class"), repository_cache.version("account"))
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+
+    page_size = page_limit(limit)
     
-    if get_class.id is not None:
-        cls = await ClassRepository.get_class_by_id(db, get_class.id)
-        classes = [cls] if cls else None
-    elif get_class.name is not None:
-        cls = await ClassRepository.get_class_by_name(db, get_class.name)
-        classes = [cls] if cls else None
-    elif get_class.teacher is not None:
-        account = await AccountRepository.get_account_by_name(db, get_class.teacher)
+    if get_class.id is not None or get_class.name is not None:
+        if get_class.id is not None:
+            cls = await loaders.class_by_id.load(get_class.id)
+        else:
+            cls = await loaders.class_by_name.load(get_class.name)  # type: ignore
+        if cls is None:
+            return Response("Class not found.", data=None, success=False)
+        display_classes = await ClassRepository.to_display(db, [cls], loaders.account_by_id)
+        return Response("Class retrieved successfully.", data=display_classes)
+
+    teacher = None
+    if get_class.teacher is not None:
+        account = await loaders.account_by_name.load(get_class.teacher)
         if account is None or account.id is None:
             return Response("Teacher not found.", data=None, success=False)
-        classes = await ClassRepository.get_classes_by_teacher(db, account.id)
-    else:
-        classes = await ClassRepository.get_classes(db)
-    
-    if not classes:
+        teacher = account.id
+
+    rows, next_cursor = await ClassRepository.get_rows(db, page_size, after, teacher)
+    if not rows:
         return Response("Class not found.", data=None, success=False)
-        
-    display_classes = await ClassRepository.to_display(db, classes)
-    return Response("Class retrieved successfully.", data=display_classes)
\ No newline at end of file
+
+    rows = await ClassRepository.name_rows(db, rows, loaders.account_by_id)
+    return fast_response(
+        "Class retrieved successfully.", data=rows, next_cursor=next_cursor, headers={"ETag": etag}
+    )
\ No newline at end of file
@@ -1,46 +1,42 @@
 from surrealdb import RecordID
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Request, Depends
-import statistics
+from typing import AsyncIterator, List, Literal, Optional, Dict, Any, Union
+from fastapi import APIRouter, Depends, Request, Response as HTTPResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import csv
+import io
+import orjson
 
-from app.db import db
+from app.config import EXPORT_BATCH_SIZE
+from app.db import QueryError, db
 from app.models import Record, Response
 from app.models.account import Auth
-from app.models.evaluation import Evaluation, EvaluationModel, CreateEvaluation, EvaluationStats
-from app.repositories.account import AccountRepository
-from app.repositories.cls import ClassRepository
-from app.repositories.evaluation import EvaluationRepository
-router = APIRouter()
+from app.models.evaluation import (
+    Evaluation, EvaluationModel, CreateEvaluation, EvaluationStats, TeacherRanking, CrossTabStats
+)
+from app.repositories.cache import repository_cache
+from app.repositories.evaluation import CLASS_NOT_FOUND, EvaluationRepository
+from app.repositories.loader import Loaders, get_loaders
+from app.repositories.snapshot import SnapshotRepository
+from app.repositories.stats import StatsRepository
+from app.models.account import AccountModel
+from app.utils.auth import AuthRoute, get_current_account
+from app.utils.etag import make_etag, not_modified
+from app.utils.pagination import page_limit
+from app.utils.response import fast_response
+router = APIRouter(route_class=AuthRoute)
 
 
 @router.put("")
-async def create_evaluation(evaluation: CreateEvaluation, request: Request) -> Response[Optional[Record]]:
-    auth = request.state.auth
-    
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-
-    if account is None or account.id is None:
+async def create_evaluation(
+    evaluation: CreateEvaluation, account: AccountModel = Depends(get_current_account)
+) -> Response[Optional[Record]]:
+    if account.id is None:
         return Response("Account not found.", data=None, success=False)
     if account.type == "teacher":
         return Response(
             "Only student can create an evaluation.", data=None, success=False
         )
     
-    cls = await ClassRepository.get_class_by_name(db, evaluation.cls)
-    if cls is None or cls.id is None:
-        return Response("Class not found.", data=None, success=False)
-
-    cls_model = cls.to_model()
-    if cls_model.id is None:
-        return Response("Class ID not found.", data=None, success=False)
-    
-    old_evaluation_model = await EvaluationRepository.get_evaluations_by_user_id_and_cls_id(db, account.id, cls_model.id)
-    print(old_evaluation_model)
-    if old_evaluation_model is not None and old_evaluation_model.id is not None:
-        return Response("Evaluation already exists.", data=Record(id=old_evaluation_model.id.id), success=False)
-    elif old_evaluation_model is not None:
-        return Response("Evaluation already exists.", data=None, success=False)
-    
     if evaluation.score > 5:
         evaluation.score = 5
     elif evaluation.score < 1:
@@ -48,33 +44,33 @@ async def create_evaluation(evaluation: CreateEvaluation, request: Request) -> R
     
     evaluation.score = int(evaluation.score)
 
-    evaluation_model = EvaluationModel(
-        id=None,
-        user=account.id,
-        cls=cls_model.id,
-        score=evaluation.score,
-        comment=evaluation.comment,
-    )
-    
-    evaluation_model = await EvaluationRepository.create_evaluation(db, evaluation_model)
-
-    if evaluation_model is None:
-        return Response("Failed to create evaluation.", data=None, success=False)
+    # One transaction resolves the class, inserts and updates the statistics;
+    # the unique (user, cls) index rejects a second submission atomically.
+    try:
+        evaluation_model = await EvaluationRepository.submit_evaluation(
+            db, account.id, evaluation.cls, evaluation.score, evaluation.comment
+        )
+    except QueryError as e:
+        existing = EvaluationRepository.duplicate_of(e)
+        if existing is not None:
+            return Response("Evaluation already exists.", data=Record(id=existing), success=False)
+        if CLASS_NOT_FOUND in e.message:
+            return Response("Class not found.", data=None, success=False)
+        raise
 
     if evaluation_model.id is None:
         return Response("Failed to get evaluation ID.", data=None, success=False)
-        
+
     return Response(
         "Evaluation created successfully.",
         data= Record(id=evaluation_model.id.id),
     )
 
 @router.delete("")
-async def delete_evaluation_by_id(id: str, request: Request) -> Response[None]:
-    auth = request.state.auth
-    
-    account = await AccountRepository.get_account_by_name(db, auth.username)
-    if account is None or account.id is None:
+async def delete_evaluation_by_id(
+    id: str, account: AccountModel = Depends(get_current_account)
+) -> Response[None]:
+    if account.id is None:
         return Response("Account not found.", data=None, success=False)
     if account.type == "teacher":
         return Response(
@@ -89,18 +85,29 @@ async def delete_evaluation_by_id(id: str, request: Request) -> Response[None]:
             "You are not allowed to delete this evaluation.", data=None, success=False
         )
     
-    await db.delete(RecordID("evaluation", id))
+    await EvaluationRepository.delete_evaluation(db, id)
     return Response("Evaluation deleted successfully.")
 
 
-@router.get("")
+@router.get("", response_model=Response[List[Evaluation]])
 async def get_evaluations(
     id: Optional[str] = None, 
     user_id: Optional[str] = None, 
     class_id: Optional[str] = None,
     user_name: Optional[str] = None,
-    class_name: Optional[str] = None
-) -> Response[List[Evaluation]]:
+    class_name: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders),
+) -> Union[ORJSONResponse, Response[List[Evaluation]]]:
+    page_size = page_limit(limit)
+
+    if user_name is not None:
+        account = await loaders.account_by_name.load(user_name)
+        if account is None or account.id is None:
+            return Response("Account not found.", data=[], success=False)
+        user_id = account.id.id
+
     if user_id is not None and class_id is not None:
         evaluation_model = await EvaluationRepository.get_evaluations_by_user_id_and_cls_id(
             db, 
@@ -109,72 +116,77 @@ async def get_evaluations(
         )
         if evaluation_model is None:
             return Response("Evaluation not found.", data=[], success=False)
-        return Response("Evaluation found.", data=[await EvaluationRepository.to_display(db, evaluation_model)])
+        return Response("Evaluation found.", data=await EvaluationRepository.to_display_many(db, [evaluation_model], loaders))
     
     param_count = sum(1 for param in [id, user_id, class_id, user_name, class_name] if param is not None)
     
     if param_count == 0:
-        evaluation_models = await EvaluationRepository.get_evaluations(db)
-        if evaluation_models is None:
-            return Response("Evaluation not found.", data=[], success=False)
-        evaluations = [await EvaluationRepository.to_display(db, e) for e in evaluation_models]
-        return Response("Evaluation found.", data=evaluations)
+        rows, next_cursor = await EvaluationRepository.get_rows(db, page_size, after)
+        evaluations = await EvaluationRepository.to_rows(db, rows, loaders)
+        return fast_response("Evaluation found.", data=evaluations, next_cursor=next_cursor)
 
     
     if id is not None:
         evaluation = await EvaluationRepository.get_evaluation_by_id(db, id)
         if evaluation is None:
             return Response("Evaluation not found.", data=[], success=False)
-        return Response("Evaluation found.", data=[await EvaluationRepository.to_display(db, evaluation)])
+        return Response("Evaluation found.", data=await EvaluationRepository.to_display_many(db, [evaluation], loaders))
     
-    if user_name is not None:
-        account = await AccountRepository.get_account_by_name(db, user_name)
-        if account is None or account.id is None:
-            return Response("Account not found.", data=[], success=False)
-        user_id = account.id.id
-
     if user_id is not None:
-        evaluation_models = await EvaluationRepository.get_evaluations_by_user_id(db, RecordID("account", user_id))
-        if evaluation_models is None:
-            return Response("Evaluation not found.", data=[], success=False)
-        evaluations = [await EvaluationRepository.to_display(db, e) for e in evaluation_models]
-        return Response("Evaluation found.", data=evaluations)
+        rows, next_cursor = await EvaluationRepository.get_rows(
+            db, page_size, after, user=RecordID("account", user_id)
+        )
+        evaluations = await EvaluationRepository.to_rows(db, rows, loaders)
+        return fast_response("Evaluation found.", data=evaluations, next_cursor=next_cursor)
     
     if class_name is not None:
-        cls = await ClassRepository.get_class_by_name(db, class_name)
+        cls = await loaders.class_by_name.load(class_name)
         if cls is None or cls.id is None:
             return Response("Class not found.", data=[], success=False)
         class_id = cls.id
 
     if class_id is not None:
-        evaluation_models = await EvaluationRepository.get_evaluations_by_cls_id(db, RecordID("class", class_id))
-        if evaluation_models is None:
-            return Response("Evaluation not found.", data=[], success=False)
-        evaluations = [await EvaluationRepository.to_display(db, e) for e in evaluation_models]
-        return Response("Evaluation found.", data=evaluations)
+        rows, next_cursor = await EvaluationRepository.get_rows(
+            db, page_size, after, cls=RecordID("class", class_id)
+        )
+        evaluations = await EvaluationRepository.to_rows(db, rows, loaders)
+        return fast_response("Evaluation found.", data=evaluations, next_cursor=next_cursor)
     
     return Response("Invalid request.", data=[], success=False)
 
-@router.get("/stats")
+@router.get("/stats", response_model=Response[EvaluationStats])
 async def get_evaluation_stats(
+    request: Request,
+    response: HTTPResponse,
     class_id: Optional[str] = None, 
-    class_name: Optional[str] = None
-) -> Response[EvaluationStats]:
+    class_name: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders),
+) -> Union[HTTPResponse, Response[EvaluationStats]]:
     if class_id is None and class_name is None:
         return Response("Please provide class_id or class_name parameter", data=None, success=False)
     
     if class_name is not None:
-        cls = await ClassRepository.get_class_by_name(db, class_name)
+        cls = await loaders.class_by_name.load(class_name)
         if cls is None or cls.id is None:
             return Response("Class not found", data=None, success=False)
         class_id = cls.id
     
     if class_id is None:
         return Response("Invalid class ID", data=None, success=False)
-        
-    evaluation_models = await EvaluationRepository.get_evaluations_by_cls_id(db, RecordID("class", class_id))
+
+    # The payload only changes with this class's statistics or the class
+    # itself (its name), so both versions identify it without reading it.
+    etag = make_etag(
+        "stats", class_id, repository_cache.version("class"), StatsRepository.version(RecordID("class", class_id))
+    )
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+
+    class_stats = await StatsRepository.get_class_stats(db, RecordID("class", class_id))
     
-    if evaluation_models is None or len(evaluation_models) == 0:
+    if class_stats is None or class_stats.count == 0:
         return Response("No evaluation data found", data=EvaluationStats(
             count=0,
             average=0,
@@ -191,28 +203,75 @@ async def get_evaluation_stats(
             }
         ), success=True)
     
-    scores = [e.score for e in evaluation_models]
-    
-    distribution = {str(i): 0 for i in range(1, 6)}
-    for score in scores:
-        distribution[str(score)] += 1
-    
-    course_name = class_name
-    if course_name is None and len(evaluation_models) > 0:
-        cls_record_id = evaluation_models[0].cls
-        cls = await ClassRepository.get_class_by_id(db, cls_record_id.id)
-        course_name = cls.name if cls else None
-    
-    stats = EvaluationStats(
-        count=len(scores),
-        average=round(statistics.mean(scores), 2) if scores else 0,
-        max=max(scores) if scores else 0,
-        min=min(scores) if scores else 0,
-        class_id=class_id,
-        class_name=course_name,
-        distribution=distribution
-    )
+    stats = class_stats.to_stats(class_name)
     
     return Response("Statistics retrieved successfully", data=stats, success=True)
 
 
+@router.get("/stats/all")
+async def get_all_evaluation_stats(
+    teacher: Optional[str] = None,
+    category: Optional[str] = None
+) -> Response[List[EvaluationStats]]:
+    stats = await StatsRepository.compute_by_class(db, teacher, category)
+    return Response("Statistics retrieved successfully", data=stats, success=True)
+
+
+@router.get("/stats/crosstab")
+async def get_crosstab_stats(
+    teacher: Optional[str] = None,
+    category: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders),
+) -> Response[List[CrossTabStats]]:
+    teacher_id = None
+    if teacher is not None:
+        account = await loaders.account_by_name.load(teacher)
+        if account is None or account.id is None:
+            return Response("Teacher not found.", data=None, success=False)
+        teacher_id = str(account.id.id)
+
+    snapshot = await SnapshotRepository.ensure_loaded(db)
+    stats = snapshot.crosstab(teacher_id, category)
+
+    teachers = await loaders.account_by_id.load_many([s.teacher_id for s in stats])
+    for s in stats:
+        if s.teacher_id in teachers:
+            s.teacher_name = teachers[s.teacher_id].username
+    return Response("Statistics retrieved successfully", data=stats, success=True)
+
+
+@router.get("/ranking")
+async def get_teacher_ranking(limit: int = 10) -> Response[List[TeacherRanking]]:
+    limit = min(max(limit, 1), 100)
+    ranking = await StatsRepository.get_teacher_ranking(db, limit)
+    return Response("Ranking retrieved successfully", data=ranking, success=True)
+
+
+async def export_evaluations(format: Literal["ndjson", "csv"]) -> AsyncIterator[bytes]:
+    fields = list(Evaluation.model_fields)
+    if format == "csv":
+        yield (",".join(fields) + "\r\n").encode()
+
+    async for rows in EvaluationRepository.iter_row_batches(db, EXPORT_BATCH_SIZE):
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([getattr(row, field) for field in fields] for row in rows)
+            yield buffer.getvalue().encode()
+        else:
+            yield b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+
+@router.get("/export", response_model=None)
+async def export_evaluation(
+    format: Literal["ndjson", "csv"] = "ndjson", account: AccountModel = Depends(get_current_account)
+) -> Union[StreamingResponse, Response[None]]:
+    if account.type != "admin":
+        return Response("Permission denied. Only admin can access this resource.", data=None, success=False)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_evaluations(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=evaluations.{format}"},
+    )
@@ -0,0 +1,17 @@
+from typing import Optional
+from fastapi import APIRouter, Depends
+
+from app.models import Response
+from app.models.account import AccountModel
+from app.models.job import JobStatus
+from app.utils.auth import AuthRoute, get_current_account
+from app.utils.jobs import jobs
+router = APIRouter(route_class=AuthRoute)
+
+
+@router.get("")
+async def get_job(id: str, account: AccountModel = Depends(get_current_account)) -> Response[Optional[JobStatus]]:
+    job = jobs.get(id)
+    if job is None or (job.owner != account.username and account.type != "admin"):
+        return Response("Job not found.", data=None, success=False)
+    return Response("Job found.", data=job)
@@ -1,89 +1,132 @@
-from typing import Optional, Dict, Any, List, Callable, Union
-from surrealdb.connections.async_ws import AsyncWsSurrealConnection
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Any, Callable, Coroutine, List, Optional
+from fastapi import Request, status
+from fastapi.routing import APIRoute
+from starlette.datastructures import QueryParams
 from starlette.responses import Response, JSONResponse
-from surrealdb import RecordID
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import ValidationError
 import json
 
-from app.models.account import AccountModel, Account, Auth
+from app.models.account import Auth, AccountModel
 from app.db import db
 from app.repositories.account import AccountRepository
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, exclude_paths: List[str] = []):
-        super().__init__(app)
+
+class AuthMiddleware:
+    def __init__(self, app: ASGIApp, exclude_paths: List[str] = []):
+        self.app = app
         self.exclude_paths = exclude_paths or ["/account/login", "/account/register" ]
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        path = request.url.path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path: str = scope["path"]
 
         for exclude_path in self.exclude_paths:
-            if path.startswith(exclude_path):           
-                return await call_next(request)
-        
-        if request.method == "GET":
-            query_params = dict(request.query_params)
+            if path.startswith(exclude_path):
+                return await self.app(scope, receive, send)
+
+        if scope["method"] == "GET":
+            query_params = QueryParams(scope["query_string"])
             if "username" not in query_params or "token" not in query_params:
-                return JSONResponse(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    content={"detail": "Missing authentication credentials"}
-                )
-            
+                return await self.reject(scope, receive, send, "Missing authentication credentials")
+
             auth = Auth(username=query_params["username"], token=query_params["token"])
-            if not await AccountRepository.verify_auth(db, auth.username, auth.token):
-                return JSONResponse(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    content={"detail": "Invalid authentication credentials"}
-                )
-            
-            request.state.auth = auth
-            
-            return await call_next(request)
-        else:
-            body_bytes = await request.body()
-            
-            if not body_bytes:
-                return JSONResponse(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    content={"detail": "Missing request body"}
-                )
-            
-            try:
-                body = json.loads(body_bytes)
-            except:
-                return JSONResponse(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    content={"detail": "Invalid request body"}
-                )
-
-        if "auth" not in body:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "Missing authentication credentials"}
+            account = await AccountRepository.verify_auth(db, auth.username, auth.token)
+            if account is None:
+                return await self.reject(scope, receive, send, "Invalid authentication credentials")
+
+            state = scope.setdefault("state", {})
+            state["auth"] = auth
+            state["account"] = account
+            return await self.app(scope, receive, send)
+
+        body_bytes = await self.read_body(receive)
+        if body_bytes is None:
+            return
+
+        if not body_bytes:
+            return await self.reject(scope, receive, send, "Missing request body")
+
+        try:
+            body = json.loads(body_bytes)
+        except ValueError:
+            return await self.reject(
+                scope, receive, send, "Invalid request body", status.HTTP_400_BAD_REQUEST
             )
-        
+
+        if not isinstance(body, dict) or "auth" not in body:
+            return await self.reject(scope, receive, send, "Missing authentication credentials")
+
         try:
             auth = Auth(**body["auth"])
-        except:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "Invalid authentication format"}
-            )
-        
-        if not await AccountRepository.verify_auth(db, auth.username, auth.token):
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"detail": "Invalid authentication credentials"}
-            )
-        
-        request.state.auth = auth
-        
-        if request.method == "GET":
-            request.state.params = body.get("params", {})
-        else:
-            request.state.data = body.get("data", {})
-            await request.body()
-            setattr(request, "_body", json.dumps(body.get("data", {})).encode())
-            
-        return await call_next(request)
+        except (TypeError, ValidationError):
+            return await self.reject(scope, receive, send, "Invalid authentication format")
+
+        account = await AccountRepository.verify_auth(db, auth.username, auth.token)
+        if account is None:
+            return await self.reject(scope, receive, send, "Invalid authentication credentials")
+
+        state = scope.setdefault("state", {})
+        state["auth"] = auth
+        state["account"] = account
+        state["data"] = body.get("data", {})
+
+        # Downstream only needs a non-empty body to trigger FastAPI's body
+        # parsing; AuthRequest.json() then hands over `state["data"]` as is.
+        replayed = False
+
+        async def replay() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body_bytes, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def read_body(receive: Receive) -> Optional[bytes]:
+        chunks: List[bytes] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def reject(
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        detail: str,
+        status_code: int = status.HTTP_401_UNAUTHORIZED,
+    ) -> None:
+        response = JSONResponse(status_code=status_code, content={"detail": detail})
+        await response(scope, receive, send)
+
+
+class AuthRequest(Request):
+    async def json(self) -> Any:
+        state = self.scope.get("state", {})
+        if "data" in state:
+            return state["data"]
+        return await super().json()
+
+
+def get_current_account(request: Request) -> AccountModel:
+    # Set by AuthMiddleware together with `request.state.auth`.
+    return request.state.account
+
+
+class AuthRoute(APIRoute):
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        route_handler = super().get_route_handler()
+
+        async def auth_route_handler(request: Request) -> Response:
+            return await route_handler(AuthRequest(request.scope, request.receive))
+
+        return auth_route_handler
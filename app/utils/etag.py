@@ -0,0 +1,38 @@
+from typing import Any, Optional
+from starlette.requests import Request
+from starlette.responses import Response
+import hashlib
+import secrets
+import time
+
+from app.config import ETAG_TTL
+
+# Versions are counted per process and restart from zero, so every tag also
+# carries a per-process nonce and a time window: a write made by another worker
+# process invalidates the tags handed out here within ETAG_TTL seconds.
+BOOT_NONCE = secrets.token_hex(4)
+
+
+def make_etag(*parts: Any) -> str:
+    window = int(time.time() // ETAG_TTL) if ETAG_TTL > 0 else int(time.time())
+    # Parts may include request parameters, so digest them into a header-safe
+    # token instead of embedding them as is.
+    key = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{BOOT_NONCE}.{window}.{key}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match.
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -0,0 +1,51 @@
+from typing import Any, Awaitable, Callable, Optional, Set
+from fastapi.logger import logger
+import asyncio
+import secrets
+import time
+
+from app.config import JOB_REGISTRY_SIZE, JOB_TTL
+from app.models.job import JobStatus
+from app.utils.cache import TTLCache
+
+
+class JobRegistry:
+    # Runs long operations in the background of this worker process; their
+    # status is only known here and is forgotten JOB_TTL after they finish.
+    def __init__(self, maxsize: int, ttl: float):
+        self.jobs: TTLCache[str, JobStatus] = TTLCache(maxsize, ttl)
+        self.tasks: Set[asyncio.Task] = set()
+
+    def submit(self, kind: str, owner: str, run: Callable[[], Awaitable[Any]]) -> JobStatus:
+        job = JobStatus(id=secrets.token_hex(8), kind=kind, owner=owner, created_at=time.time())
+        self.jobs.set(job.id, job)
+
+        task = asyncio.create_task(self._run(job, run))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return job.model_copy()
+
+    async def _run(self, job: JobStatus, run: Callable[[], Awaitable[Any]]) -> None:
+        job.status = "running"
+        try:
+            job.result = await run()
+            job.status = "succeeded"
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.kind}) failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            # Re-set so the TTL counts from completion, not submission.
+            self.jobs.set(job.id, job)
+
+    def get(self, id: str) -> Optional[JobStatus]:
+        job = self.jobs.get(id)
+        return None if job is None else job.model_copy()
+
+    async def wait(self) -> None:
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+jobs = JobRegistry(JOB_REGISTRY_SIZE, JOB_TTL)
@@ -0,0 +1,63 @@
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+import asyncio
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+# Deduplicates loads by key and coalesces the ones issued in the same event
+# loop tick into a single call of `batch`, which returns the values it found.
+class Loader(Generic[K, V]):
+    def __init__(self, batch: Callable[[List[K]], Awaitable[Dict[K, V]]]):
+        self.batch = batch
+        self._futures: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        self._pending: List[K] = []
+
+    async def load(self, key: K) -> Optional[V]:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                # Runs after every task that is already ready in this tick,
+                # so their loads end up in the same batch.
+                loop.call_soon(self._dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[K]) -> Dict[K, V]:
+        unique = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(key) for key in unique))
+        return {key: value for key, value in zip(unique, values) if value is not None}
+
+    def prime(self, key: K, value: V) -> None:
+        if key not in self._futures:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._futures[key] = future
+
+    def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        asyncio.ensure_future(self._run(keys))
+
+    async def _run(self, keys: List[K]) -> None:
+        try:
+            values = await self.batch(keys)
+        except BaseException as e:
+            for key in keys:
+                # Failed loads are not cached so a later load can retry.
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark the exception as retrieved in case nobody awaits it.
+                    future.exception()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for key in keys:
+            future = self._futures[key]
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,178 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Everything here runs on the event loop thread, so plain integer and float
+# updates are atomic and the counters need no locks.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.requests: Dict[Labels, int] = defaultdict(int)
+        self.in_flight: Dict[Labels, int] = defaultdict(int)
+        self.latency: Dict[Labels, Histogram] = {}
+        self.request_queries: Dict[Labels, Histogram] = {}
+        self.request_db_seconds: Dict[Labels, Histogram] = {}
+        self.queries: Dict[Labels, int] = defaultdict(int)
+        self.query_seconds: Dict[Labels, float] = defaultdict(float)
+
+    def record_query(self, operation: str, seconds: float) -> None:
+        labels = (("operation", operation),)
+        self.queries[labels] += 1
+        self.query_seconds[labels] += seconds
+
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += seconds
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        labels = (("method", method), ("route", route))
+        self.requests[(*labels, ("status", str(status)))] += 1
+        observe(self.latency, labels, LATENCY_BUCKETS, seconds)
+        observe(self.request_queries, labels, QUERY_COUNT_BUCKETS, stats.queries)
+        observe(self.request_db_seconds, labels, LATENCY_BUCKETS, stats.seconds)
+
+    def render(self) -> List[str]:
+        lines: List[str] = []
+        counter(lines, "taluation_http_requests_total", "HTTP requests handled.", self.requests)
+        gauge(lines, "taluation_http_requests_in_flight", "HTTP requests being handled.", self.in_flight)
+        histogram(lines, "taluation_http_request_duration_seconds", "HTTP request latency.", self.latency)
+        histogram(
+            lines, "taluation_http_request_db_queries", "Database calls made per HTTP request.", self.request_queries
+        )
+        histogram(
+            lines,
+            "taluation_http_request_db_seconds",
+            "Time spent in database calls per HTTP request.",
+            self.request_db_seconds,
+        )
+        counter(lines, "taluation_db_queries_total", "Database calls made.", self.queries)
+        counter(lines, "taluation_db_query_seconds_total", "Time spent in database calls.", self.query_seconds)
+        return lines
+
+
+def observe(histograms: Dict[Labels, Histogram], labels: Labels, buckets: Sequence[float], value: float) -> None:
+    h = histograms.get(labels)
+    if h is None:
+        h = histograms[labels] = Histogram(buckets)
+    h.observe(value)
+
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = ",".join(f'{k}="{escape(v)}"' for k, v in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def counter(lines: List[str], name: str, help: str, values: Mapping[Labels, float]) -> None:
+    series(lines, name, help, "counter", values)
+
+
+def gauge(lines: List[str], name: str, help: str, values: Mapping[Labels, float]) -> None:
+    series(lines, name, help, "gauge", values)
+
+
+def series(lines: List[str], name: str, help: str, type: str, values: Mapping[Labels, float]) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {type}")
+    for labels, value in sorted(values.items()):
+        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+
+def histogram(lines: List[str], name: str, help: str, histograms: Dict[Labels, Histogram]) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*h.buckets, float("inf")), h.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels((*labels, ('le', format_value(bound))))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(h.sum)}")
+        lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    # Outermost middleware, so latency includes authentication. Requests are
+    # labelled by route template (`/evaluation/stats`, not the raw path) to
+    # keep the number of series bounded.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method: str = scope["method"]
+        in_flight = (("method", method),)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        metrics.in_flight[in_flight] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight[in_flight] -= 1
+            request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            metrics.record_request(method, path, status, elapsed, stats)
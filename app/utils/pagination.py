@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Optional, Tuple
+from surrealdb import RecordID
+
+from app.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+
+
+def page_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return PAGE_SIZE_DEFAULT
+    return min(max(limit, 1), PAGE_SIZE_MAX)
+
+
+def keyset(
+    table: str, conditions: List[str], limit: int, after: Optional[str], fields: str = "*"
+) -> Tuple[str, Dict[str, Any]]:
+    # Fetch one extra row so we know whether another page follows.
+    params: Dict[str, Any] = {"limit": limit + 1}
+    if after is not None:
+        conditions = [*conditions, "id > $after"]
+        params["after"] = RecordID(table, after)
+
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    return f"SELECT {fields} FROM {table} {where}ORDER BY id LIMIT $limit", params
+
+
+def split_page(rows: Optional[List[dict]], limit: int) -> Tuple[List[dict], Optional[str]]:
+    rows = rows or []
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, str(rows[-1]["id"].id)
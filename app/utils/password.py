@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from argon2.exceptions import VerifyMismatchError
+import asyncio
+import statistics
+import time
+import argon2
+
+from app.config import (
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    PASSWORD_HASH_CONCURRENCY,
+)
+
+# argon2-cffi releases the GIL while hashing, so a thread pool keeps the event
+# loop responsive; the semaphore bounds how many hashes run at once and lets
+# the rest queue up without occupying executor threads.
+executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="argon2")
+limiter = asyncio.Semaphore(PASSWORD_HASH_CONCURRENCY)
+
+
+class PasswordMetrics:
+    def __init__(self):
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "queue_seconds_total": self.queue_seconds_total,
+            "queue_seconds_max": self.queue_seconds_max,
+            "hash_seconds_total": self.hash_seconds_total,
+        }
+
+
+metrics = PasswordMetrics()
+
+
+def _hash(password: bytes, salt: Optional[bytes], time_cost: int, memory_cost: int, parallelism: int) -> bytes:
+    return argon2.hash_password(
+        password, salt=salt, time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism
+    )
+
+
+def _verify(hash: bytes, password: bytes) -> bool:
+    try:
+        return argon2.verify_password(hash, password)
+    except VerifyMismatchError:
+        return False
+
+
+async def _run(fn, *args):
+    queued_at = time.perf_counter()
+    metrics.waiting += 1
+    try:
+        await limiter.acquire()
+    finally:
+        metrics.waiting -= 1
+
+    started_at = time.perf_counter()
+    queued = started_at - queued_at
+    metrics.queue_seconds_total += queued
+    metrics.queue_seconds_max = max(metrics.queue_seconds_max, queued)
+    metrics.running += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        metrics.running -= 1
+        metrics.completed += 1
+        metrics.hash_seconds_total += time.perf_counter() - started_at
+        limiter.release()
+
+
+async def hash_password(password: str, salt: Optional[str] = None) -> str:
+    hashed: bytes = await _run(
+        _hash,
+        password.encode(),
+        None if salt is None else salt.encode(),
+        ARGON2_TIME_COST,
+        ARGON2_MEMORY_COST,
+        ARGON2_PARALLELISM,
+    )
+    return hashed.decode()
+
+
+async def verify_password(hash: str, password: str) -> bool:
+    return await _run(_verify, hash.encode(), password.encode())
+
+
+def calibrate(target_ms: float, memory_cost: int, parallelism: int, samples: int = 5, max_time_cost: int = 20) -> Dict[str, float]:
+    # Pick the largest time cost whose median latency stays within the target.
+    best = {"time_cost": 1, "memory_cost": memory_cost, "parallelism": parallelism, "latency_ms": 0.0}
+    for time_cost in range(1, max_time_cost + 1):
+        latencies = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            _hash(b"calibration-password", b"calibration-salt", time_cost, memory_cost, parallelism)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latency = statistics.median(latencies)
+        if latency > target_ms and time_cost > 1:
+            break
+        best = {"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism, "latency_ms": latency}
+        if latency > target_ms:
+            break
+    return best
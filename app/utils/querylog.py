@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Optional, Tuple
+import logging
+
+from surrealdb import RecordID
+import orjson
+
+from app.config import QUERY_STATS_SIZE, SLOW_QUERY_THRESHOLD
+from app.models.query import QueryStat
+
+# A dedicated logger so slow queries can be routed or silenced on their own.
+slow_query_logger = logging.getLogger("taluation.slow_query")
+
+
+@lru_cache(maxsize=1024)
+def normalize(statement: str) -> str:
+    # Statements are mostly indented f-string literals; collapsing whitespace
+    # makes every call site of the same statement share one entry.
+    return " ".join(statement.split())
+
+
+def shape(params: Any) -> str:
+    # Only names and types, never values: parameters carry passwords and tokens.
+    if not isinstance(params, dict):
+        return "" if params is None else type_name(params)
+    return ", ".join(f"{key}: {type_name(value)}" for key, value in params.items())
+
+
+def type_name(value: Any) -> str:
+    if isinstance(value, RecordID):
+        return f"record<{value.table_name}>"
+    if isinstance(value, (list, tuple)):
+        return f"list[{len(value)}]"
+    return type(value).__name__
+
+
+def count_rows(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get("result"), list):
+        # Raw responses hold one entry per statement.
+        return sum(count_rows(r.get("result")) for r in result["result"] if isinstance(r, dict))
+    return 1
+
+
+class QueryLog:
+    # Aggregates every database call by statement and parameter shape, and
+    # logs the ones slower than `threshold`. When full, the entry with the
+    # least total time is dropped to make room.
+    def __init__(self, threshold: float, maxsize: int):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.entries: Dict[Tuple[str, str, str], QueryStat] = {}
+
+    def record(
+        self, operation: str, statement: str, params: Any, seconds: float, result: Any, error: Optional[str] = None
+    ) -> None:
+        statement = normalize(statement)
+        params_shape = shape(params)
+        rows = count_rows(result)
+
+        key = (operation, statement, params_shape)
+        entry = self.entries.get(key)
+        if entry is None:
+            if self.maxsize <= 0:
+                return
+            if len(self.entries) >= self.maxsize:
+                del self.entries[min(self.entries, key=lambda k: self.entries[k].total_seconds)]
+            entry = self.entries[key] = QueryStat(operation=operation, statement=statement, params=params_shape)
+        entry.calls += 1
+        entry.rows += rows
+        entry.total_seconds += seconds
+        entry.max_seconds = max(entry.max_seconds, seconds)
+        if error is not None:
+            entry.errors += 1
+
+        if seconds >= self.threshold:
+            entry.slow_calls += 1
+            slow_query_logger.warning(
+                orjson.dumps(
+                    {
+                        "event": "slow_query",
+                        "operation": operation,
+                        "statement": statement,
+                        "params": params_shape,
+                        "seconds": round(seconds, 6),
+                        "rows": rows,
+                        "error": error,
+                    }
+                ).decode()
+            )
+
+    def top(
+        self, limit: int, order: Literal["total_seconds", "max_seconds", "calls"] = "total_seconds"
+    ) -> List[QueryStat]:
+        entries = sorted(self.entries.values(), key=lambda e: getattr(e, order), reverse=True)
+        return [e.model_copy() for e in entries[:limit]]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+query_log = QueryLog(SLOW_QUERY_THRESHOLD, QUERY_STATS_SIZE)
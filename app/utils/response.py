@@ -0,0 +1,17 @@
+from typing import Any, Dict, Optional
+from fastapi.responses import ORJSONResponse
+
+
+def fast_response(
+    message: str,
+    data: Any = None,
+    success: bool = True,
+    next_cursor: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> ORJSONResponse:
+    # Same envelope as app.models.Response, serialized by orjson without
+    # validating `data`; meant for the projection rows of app.models.projection.
+    # Returned as is, so headers set on an injected Response do not apply.
+    return ORJSONResponse(
+        {"message": message, "data": data, "success": success, "next_cursor": next_cursor}, headers=headers
+    )
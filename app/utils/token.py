@@ -0,0 +1,14 @@
+import hashlib
+import secrets
+
+from app.config import AUTH_TOKEN_BYTES
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(AUTH_TOKEN_BYTES)
+
+
+def token_digest(token: str) -> str:
+    # Tokens are high-entropy random strings, so a plain SHA-256 is enough;
+    # only the digest is stored, never the token itself.
+    return hashlib.sha256(token.encode()).hexdigest()
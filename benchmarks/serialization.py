@@ -0,0 +1,141 @@
+"""Per-row CPU cost of serializing the list endpoints, before and after the
+projection fast path. Needs no database: rows are synthesized in the shape the
+SurrealDB client returns them.
+
+    python benchmarks/serialization.py --rows 5000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, List
+
+import orjson
+from pydantic import TypeAdapter
+from surrealdb import RecordID
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Response  # noqa: E402
+from app.models.account import Account, AccountResponse  # noqa: E402
+from app.models.cls import Class, DisplayClass  # noqa: E402
+from app.models.evaluation import Evaluation, EvaluationModel  # noqa: E402
+from app.models.projection import AccountRow, ClassRow, EvaluationRow  # noqa: E402
+
+
+def evaluation_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": RecordID("evaluation", f"e{i}"),
+            "user": RecordID("account", f"u{i % 500}"),
+            "cls": RecordID("class", f"c{i % 50}"),
+            "score": i % 5 + 1,
+            "comment": "Clear explanations, fair grading and well prepared lectures.",
+        }
+        for i in range(n)
+    ]
+
+
+def class_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": RecordID("class", f"c{i}"),
+            "name": f"Class {i}",
+            "teacher": RecordID("account", f"t{i % 20}"),
+            "category": "required",
+            "description": "An introductory course with weekly assignments.",
+        }
+        for i in range(n)
+    ]
+
+
+def account_rows(n: int) -> List[dict]:
+    return [
+        {
+            "id": RecordID("account", f"u{i}"),
+            "username": f"student{i}",
+            "password": "$argon2i$v=19$m=65536,t=3,p=4$c2FsdHNhbHQ$aGFzaGhhc2hoYXNoaGFzaA",
+            "email": f"student{i}@example.com",
+            "phone": f"1380000{i:04d}",
+            "type": "student",
+        }
+        for i in range(n)
+    ]
+
+
+def fastapi_render(model, value) -> bytes:
+    # What FastAPI does for a validated `response_model`: validate, dump in
+    # JSON mode, then JSONResponse.render.
+    adapter = TypeAdapter(model)
+    content = adapter.dump_python(adapter.validate_python(value), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def evaluations_before(rows: List[dict]) -> bytes:
+    evaluations = [EvaluationModel(**row).to_raw() for row in rows]
+    for evaluation in evaluations:
+        evaluation.user = f"name-{evaluation.user}"
+        evaluation.cls = f"name-{evaluation.cls}"
+    return fastapi_render(Response[List[Evaluation]], Response("Evaluation found.", data=evaluations))
+
+
+def evaluations_after(rows: List[dict]) -> bytes:
+    usernames = {f"u{i}": f"name-u{i}" for i in range(500)}
+    class_names = {f"c{i}": f"name-c{i}" for i in range(50)}
+    data = [EvaluationRow.from_row(row, usernames, class_names) for row in rows]
+    return orjson.dumps({"message": "Evaluation found.", "data": data, "success": True, "next_cursor": None})
+
+
+def classes_before(rows: List[dict]) -> bytes:
+    classes = [Class(**row) for row in rows]
+    display = []
+    for cls in classes:
+        item = cls.to_list()
+        item.teacher = f"name-{cls.teacher}"
+        display.append(item)
+    return fastapi_render(Response[List[DisplayClass]], Response("Class retrieved successfully.", data=display))
+
+
+def classes_after(rows: List[dict]) -> bytes:
+    data = [row.named(f"name-{row.teacher}") for row in (ClassRow.from_row(r) for r in rows)]
+    return orjson.dumps({"message": "Class retrieved successfully.", "data": data, "success": True, "next_cursor": None})
+
+
+def accounts_before(rows: List[dict]) -> bytes:
+    accounts = [Account(**row).to_model().to_response() for row in rows]
+    return fastapi_render(Response[List[AccountResponse]], Response("Users found.", data=accounts))
+
+
+def accounts_after(rows: List[dict]) -> bytes:
+    data = [AccountRow.from_row(row) for row in rows]
+    return orjson.dumps({"message": "Users found.", "data": data, "success": True, "next_cursor": None})
+
+
+def measure(fn: Callable[[List[dict]], bytes], rows: List[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(rows)
+        best = min(best, time.process_time() - started)
+    return best / len(rows) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark list endpoint serialization")
+    parser.add_argument("--rows", type=int, default=5000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the fastest is reported")
+    args = parser.parse_args()
+
+    cases = [
+        ("evaluations", evaluation_rows(args.rows), evaluations_before, evaluations_after),
+        ("classes", class_rows(args.rows), classes_before, classes_after),
+        ("accounts", account_rows(args.rows), accounts_before, accounts_after),
+    ]
+    print(f"{'endpoint':<12} {'before us/row':>14} {'after us/row':>13} {'speedup':>8}")
+    for name, rows, before, after in cases:
+        assert json.loads(before(rows[:3]))["data"] == json.loads(after(rows[:3]))["data"]
+        old = measure(before, rows, args.repeat)
+        new = measure(after, rows, args.repeat)
+        print(f"{name:<12} {old:>14.2f} {new:>13.2f} {old / new:>7.1f}x")
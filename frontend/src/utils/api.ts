@@ -1,6 +1,19 @@
 import router from '@/router';
 import request from './request';
 
+// List endpoints are paginated server-side; each call fetches one page and
+// views pass the returned `next_cursor` back as `after` to load the next one.
+async function getPage(
+	url: string,
+	params: Record<string, unknown> = {},
+	after?: string | null,
+) {
+	const res = await request.get(url, {
+		params: { ...params, after: after ?? undefined },
+	});
+	return res.data;
+}
+
 export function logout(needRequest = true) {
 	const token = localStorage.getItem('token');
 	const username = localStorage.getItem('username');
@@ -68,10 +81,9 @@ export async function updateProfile(data: {
 	}
 }
 
-export async function getUsers() {
+export async function getUsers(after?: string | null) {
 	try {
-		const res = await request.get('/account/users');
-		return res.data;
+		return await getPage('/account/users', {}, after);
 	} catch (error) {
 		return error;
 	}
@@ -120,16 +132,16 @@ export async function updateClass(data: {
 	}
 }
 
-export async function getClasses(data: {
-	id?: string;
-	name?: string;
-	teacher?: string;
-}) {
+export async function getClasses(
+	data: {
+		id?: string;
+		name?: string;
+		teacher?: string;
+	},
+	after?: string | null,
+) {
 	try {
-		const res = await request.get('/class', {
-			params: data,
-		});
-		return res.data;
+		return await getPage('/class', data, after);
 	} catch (error) {
 		return error;
 	}
@@ -166,24 +178,28 @@ export async function getEvaluationStats(data: {
 	}
 }
 
-export async function getEvaluations(data: {
-	id?: string;
-	user_id?: string;
-	class_id?: string;
-	user_name?: string;
-	class_name?: string;
-}) {
+export async function getEvaluations(
+	data: {
+		id?: string;
+		user_id?: string;
+		class_id?: string;
+		user_name?: string;
+		class_name?: string;
+	},
+	after?: string | null,
+) {
 	try {
-		const res = await request.get('/evaluation', {
-			params: {
+		return await getPage(
+			'/evaluation',
+			{
 				id: data.id,
 				user_id: data.user_id,
 				class_id: data.class_id,
 				user_name: data.user_name,
 				class_name: data.class_name,
 			},
-		});
-		return res.data;
+			after,
+		);
 	} catch (error) {
 		return error;
 	}
@@ -1,45 +1,381 @@
+import asyncio
+import codecs
 import json
+import os
+import re
+import time
 import argon2
-from surrealdb import AsyncSurreal
+from concurrent.futures import ProcessPoolExecutor
+from surrealdb import AsyncSurreal, AsyncWsSurrealConnection, RecordID
 
 
-async def surreal_import(table_name, input_file):
+CHUNK_SIZE = 1 << 16
+SEPARATORS = re.compile(r"[ \t\r\n,]*")
+TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+async def connect():
+    db: AsyncWsSurrealConnection = AsyncSurreal("ws://127.0.0.1:5070")  # type: ignore we use async ws connection
+    await db.connect()
+    await db.signin({"username": "root", "password": "root"})
+    await db.use("main", "test")
+    return db
+
+
+async def insert_rows(db, table, rows):
+    # `query` hands back a failed statement's error message as its result,
+    # so check each statement's status and raise; the caller then counts the
+    # batch as failed and the checkpoint stays before it.
+    # IGNORE skips records whose id already exists.
+    response = await db.query_raw(f"INSERT IGNORE INTO {table} $rows", {"rows": rows})
+    if response.get("error") is not None:
+        raise RuntimeError(str(response["error"]))
+    inserted = 0
+    for result in response.get("result") or []:
+        if result.get("status") != "OK":
+            raise RuntimeError(str(result.get("result")))
+        inserted += len(result.get("result") or [])
+    return inserted
+
+
+def checkpoint_path(input_file):
+    return f"{input_file}.checkpoint"
+
+
+def load_checkpoint(input_file):
+    try:
+        with open(checkpoint_path(input_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(input_file, offset, count, last_id):
+    path = checkpoint_path(input_file)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"offset": offset, "count": count, "last_id": last_id}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_checkpoint(input_file):
+    try:
+        os.remove(checkpoint_path(input_file))
+    except FileNotFoundError:
+        pass
+
+
+def iter_jsonl(f, start):
+    offset = start
+    for line in f:
+        offset += len(line)
+        if line.strip():
+            yield json.loads(line), offset
+
+
+def iter_json_array(f, start):
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    offset = start
+    eof = False
+
+    if start == 0:
+        while not buffer.strip():
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer += text.decode(chunk)
+        pos = len(buffer) - len(buffer.lstrip())
+        if not buffer.startswith("[", pos):
+            raise ValueError("Expected a JSON array")
+        pos += 1
+        offset += len(buffer[:pos].encode())
+
+    while True:
+        # Separators are ASCII, so characters skipped equal bytes skipped.
+        skip = SEPARATORS.match(buffer, pos).end()  # type: ignore the pattern also matches the empty string
+        offset += skip - pos
+        pos = skip
+
+        if buffer.startswith("]", pos):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[pos:].strip():
+                    raise
+                return
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + text.decode(chunk, final=eof)
+            pos = 0
+            continue
+
+        offset += len(buffer[pos:end].encode())
+        pos = end
+        yield record, offset
+
+
+def iter_records(input_file, start=0):
+    # Yields (record, byte offset just past the record) while reading the file
+    # in chunks, so memory stays flat; `start` must be an offset yielded earlier.
+    with open(input_file, "rb") as f:
+        if input_file.endswith((".jsonl", ".ndjson")):
+            is_array = False
+        else:
+            is_array = f.read(CHUNK_SIZE).lstrip().startswith(b"[")
+        f.seek(start)
+        if is_array:
+            yield from iter_json_array(f, start)
+        else:
+            yield from iter_jsonl(f, start)
+
+
+def already_exists(error):
+    return "already exists" in str(error)
+
+
+def record_label(record):
+    record_id = record.get("id")
+    if record_id is None:
+        return None
+    return str(record_id)
+
+
+async def surreal_import(table_name, input_file, restart=False, checkpoint_every=100):
+    checkpoint = None if restart else load_checkpoint(input_file)
+    offset = checkpoint["offset"] if checkpoint else 0
+    count = checkpoint["count"] if checkpoint else 0
+    last_id = checkpoint["last_id"] if checkpoint else None
+    if checkpoint:
+        print(f"Resuming after {count} records (last id {last_id})")
+
+    imported = 0
+    skipped = 0
     try:
         async with AsyncSurreal("ws://127.0.0.1:5070") as db:
             await db.signin({"username": "root", "password": "root"})
             await db.use("main", "test")
 
-            with open(input_file, "r", encoding="utf-8") as f:
-                records = json.load(f)
-
-            inserted = []
-            for record in records:
-                if "id" in record:
-                    data = {k: v for k, v in record.items() if k != "id"}
-                    if data.get("password"):
-                        data["password"] = argon2.hash_password(
-                            data["password"].encode(), salt=data["username"].encode()
-                        ).decode()
-                    res = await db.create(record["id"], data)
-                    inserted.append(res)
-                else:
-                    res = await db.create(table_name, record)
-                    inserted.append(res)
-
-            print(f"Imported {len(inserted)} records")
-            return True
+            for record, next_offset in iter_records(input_file, offset):
+                try:
+                    if "id" in record:
+                        data = {k: v for k, v in record.items() if k != "id"}
+                        if data.get("password"):
+                            data["password"] = argon2.hash_password(
+                                data["password"].encode(), salt=data["username"].encode()
+                            ).decode()
+                        res = await db.create(record["id"], data)
+                    else:
+                        res = await db.create(table_name, record)
+                    imported += 1
+                    if isinstance(res, dict) and res.get("id") is not None:
+                        last_id = str(res["id"])
+                except Exception as e:
+                    if not already_exists(e):
+                        raise
+                    skipped += 1
+                    last_id = record_label(record) or last_id
+
+                offset = next_offset
+                count += 1
+                if count % checkpoint_every == 0:
+                    save_checkpoint(input_file, offset, count, last_id)
+
+        clear_checkpoint(input_file)
+        print(f"Imported {imported} records, skipped {skipped} existing")
+        return True
 
     except Exception as e:
-        print(f"Import failed: {str(e)}")
+        save_checkpoint(input_file, offset, count, last_id)
+        print(f"Import failed after {count} records: {str(e)}")
+        print(f"Checkpoint saved to {checkpoint_path(input_file)}, rerun to resume")
         return False
 
 
+def hash_batch(records):
+    # Runs in a worker process; argon2 is CPU bound and would otherwise
+    # serialize the whole import on one core.
+    hashed = []
+    for record in records:
+        record = dict(record)
+        if record.get("password") and record.get("username"):
+            record["password"] = argon2.hash_password(
+                record["password"].encode(), salt=record["username"].encode()
+            ).decode()
+        hashed.append(record)
+    return hashed
+
+
+def target_of(table_name, record):
+    record_id = record.get("id")
+    if isinstance(record_id, str) and ":" in record_id:
+        table, key = record_id.split(":", 1)
+        return table, {**record, "id": RecordID(table, key)}
+    return table_name, record
+
+
+def batched(records, batch_size):
+    batch = []
+    offset = 0
+    for record, offset in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch, offset
+            batch = []
+    if batch:
+        yield batch, offset
+
+
+async def surreal_bulk_import(
+    table_name, input_file, batch_size=500, concurrency=4, workers=None, restart=False, checkpoint_every=10
+):
+    checkpoint = None if restart else load_checkpoint(input_file)
+    start = checkpoint["offset"] if checkpoint else 0
+    if checkpoint:
+        print(f"Resuming after {checkpoint['count']} records (last id {checkpoint['last_id']})")
+
+    started = time.perf_counter()
+    stats = {
+        "records": 0,
+        "inserted": 0,
+        "batches": 0,
+        "failed": 0,
+        "hash_seconds": 0.0,
+        "insert_seconds": 0.0,
+    }
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    loop = asyncio.get_running_loop()
+
+    # Batches finish out of order; the checkpoint only advances over the
+    # contiguous prefix of finished batches so a rerun never skips one.
+    progress = {
+        "next": 0,
+        "done": {},
+        "offset": start,
+        "count": checkpoint["count"] if checkpoint else 0,
+        "last_id": checkpoint["last_id"] if checkpoint else None,
+        "since_save": 0,
+    }
+
+    def complete(seq, batch, offset):
+        progress["done"][seq] = (len(batch), offset, record_label(batch[-1]))
+        while progress["next"] in progress["done"]:
+            size, offset, last_id = progress["done"].pop(progress["next"])
+            progress["next"] += 1
+            progress["offset"] = offset
+            progress["count"] += size
+            progress["last_id"] = last_id or progress["last_id"]
+            progress["since_save"] += 1
+        if progress["since_save"] >= checkpoint_every:
+            save_checkpoint(input_file, progress["offset"], progress["count"], progress["last_id"])
+            progress["since_save"] = 0
+
+    async def insert_worker(pool, db):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            seq, batch, offset = item
+            try:
+                t0 = time.perf_counter()
+                hashed = await loop.run_in_executor(pool, hash_batch, batch)
+                t1 = time.perf_counter()
+
+                tables = {}
+                for record in hashed:
+                    table, row = target_of(table_name, record)
+                    tables.setdefault(table, []).append(row)
+                for table, rows in tables.items():
+                    if not TABLE_NAME.match(table):
+                        raise ValueError(f"Invalid table name: {table}")
+                    stats["inserted"] += await insert_rows(db, table, rows)
+
+                stats["hash_seconds"] += t1 - t0
+                stats["insert_seconds"] += time.perf_counter() - t1
+                stats["records"] += len(batch)
+                stats["batches"] += 1
+                complete(seq, batch, offset)
+            except Exception as e:
+                stats["failed"] += len(batch)
+                print(f"Batch of {len(batch)} records failed: {str(e)}")
+
+    connections = []
+    tasks = []
+    completed = False
+    try:
+        connections = await asyncio.gather(*(connect() for _ in range(concurrency)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = [asyncio.create_task(insert_worker(pool, db)) for db in connections]
+            for seq, (batch, offset) in enumerate(batched(iter_records(input_file, start), batch_size)):
+                await queue.put((seq, batch, offset))
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        completed = True
+    except Exception as e:
+        print(f"Import failed: {str(e)}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        for db in connections:
+            await db.close()
+
+    ok = completed and stats["failed"] == 0
+    if ok:
+        clear_checkpoint(input_file)
+    else:
+        save_checkpoint(input_file, progress["offset"], progress["count"], progress["last_id"])
+        print(f"Checkpoint saved to {checkpoint_path(input_file)}, rerun to resume")
+
+    elapsed = time.perf_counter() - started
+    skipped = stats["records"] - stats["inserted"]
+    print(
+        f"Imported {stats['inserted']} records in {stats['batches']} batches "
+        f"({skipped} skipped as existing, {stats['failed']} failed)"
+    )
+    print(
+        f"Elapsed {elapsed:.2f}s, {stats['records'] / elapsed if elapsed else 0:.1f} records/s "
+        f"(cumulative hashing {stats['hash_seconds']:.2f}s, inserting {stats['insert_seconds']:.2f}s across "
+        f"{concurrency} connections, {workers or os.cpu_count()} hash workers)"
+    )
+    return ok
+
+
 if __name__ == "__main__":
-    import asyncio
     import argparse
 
     parser = argparse.ArgumentParser(description="Import data into SurrealDB")
     parser.add_argument("table_name", help="The name of the table to import into")
-    parser.add_argument("input_file", help="The path to the input JSON file")
+    parser.add_argument("input_file", help="The path to the input JSON array or JSONL file")
+    parser.add_argument("--bulk", action="store_true", help="Use batched inserts over concurrent connections")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per INSERT batch in bulk mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent connections in bulk mode")
+    parser.add_argument("--workers", type=int, default=None, help="Password hashing processes in bulk mode")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start from the beginning")
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=None,
+        help="Save a checkpoint every N records (N batches in bulk mode)",
+    )
     args = parser.parse_args()
-    asyncio.run(surreal_import(args.table_name, args.input_file))
+    if args.bulk:
+        ok = asyncio.run(
+            surreal_bulk_import(
+                args.table_name,
+                args.input_file,
+                args.batch_size,
+                args.concurrency,
+                args.workers,
+                args.restart,
+                args.checkpoint_every or 10,
+            )
+        )
+    else:
+        ok = asyncio.run(
+            surreal_import(args.table_name, args.input_file, args.restart, args.checkpoint_every or 100)
+        )
+    raise SystemExit(0 if ok else 1)
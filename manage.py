@@ -0,0 +1,105 @@
+import asyncio
+import argparse
+
+from app.config import ARGON2_MEMORY_COST, ARGON2_PARALLELISM
+from app.db import db
+from app.migrations import MIGRATIONS, applied_versions, migrate
+from app.repositories.stats import StatsRepository
+from app.utils.password import calibrate
+
+
+async def rebuild_stats(check: bool = False):
+    await db.open()  # type: ignore db is a connection pool
+    try:
+        if check:
+            expected = await StatsRepository.compute_all(db)
+            stored = await StatsRepository.get_all(db)
+            mismatched = 0
+            for cls_id in sorted(set(expected) | set(stored)):
+                want = expected.get(cls_id)
+                have = stored.get(cls_id)
+                want_stats = want.to_stats() if want else None
+                have_stats = have.to_stats() if have and have.count else None
+                if want_stats != have_stats:
+                    mismatched += 1
+                    print(f"class:{cls_id}: stored={have_stats} expected={want_stats}")
+            print(f"Checked {len(expected)} classes, {mismatched} mismatched")
+            return mismatched == 0
+
+        count = await StatsRepository.rebuild(db)
+        print(f"Rebuilt statistics for {count} classes")
+        return True
+    finally:
+        await db.close()
+
+
+async def run_migrations(status: bool = False):
+    await db.open()  # type: ignore db is a connection pool
+    try:
+        if status:
+            applied = await applied_versions(db)
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version in applied else "pending"
+                print(f"{migration.version:>4} {state:<8} {migration.name}")
+            return True
+
+        ran = await migrate(db)
+        for migration in ran:
+            print(f"Applied migration {migration.version}: {migration.name}")
+        print(f"{len(ran)} migrations applied")
+        return True
+    finally:
+        await db.close()
+
+
+def calibrate_argon2(target_ms: float, memory_cost: int, parallelism: int):
+    result = calibrate(target_ms, memory_cost, parallelism)
+    print(
+        f"time_cost={result['time_cost']} memory_cost={result['memory_cost']} "
+        f"parallelism={result['parallelism']} takes {result['latency_ms']:.1f}ms per hash"
+    )
+    if result["latency_ms"] > target_ms:
+        print(f"Even the cheapest time cost exceeds {target_ms}ms, consider lowering the memory cost")
+    print(f"TALUATION_ARGON2_TIME_COST={result['time_cost']}")
+    print(f"TALUATION_ARGON2_MEMORY_COST={result['memory_cost']}")
+    print(f"TALUATION_ARGON2_PARALLELISM={result['parallelism']}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Taluation maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_stats_parser = commands.add_parser(
+        "rebuild-stats", help="Recompute per-class evaluation statistics from scratch"
+    )
+    rebuild_stats_parser.add_argument(
+        "--check", action="store_true", help="Only compare stored statistics against a fresh computation"
+    )
+
+    migrate_parser = commands.add_parser("migrate", help="Apply pending schema and index migrations")
+    migrate_parser.add_argument(
+        "--status", action="store_true", help="Only list migrations and whether they have been applied"
+    )
+
+    calibrate_argon2_parser = commands.add_parser(
+        "calibrate-argon2", help="Pick argon2 parameters for a target per-hash latency on this host"
+    )
+    calibrate_argon2_parser.add_argument(
+        "--target-ms", type=float, default=250, help="Target latency of a single hash in milliseconds"
+    )
+    calibrate_argon2_parser.add_argument(
+        "--memory-cost", type=int, default=ARGON2_MEMORY_COST, help="Memory cost in KiB"
+    )
+    calibrate_argon2_parser.add_argument(
+        "--parallelism", type=int, default=ARGON2_PARALLELISM, help="Number of lanes per hash"
+    )
+
+    args = parser.parse_args()
+    if args.command == "rebuild-stats":
+        ok = asyncio.run(rebuild_stats(args.check))
+    elif args.command == "migrate":
+        ok = asyncio.run(run_migrations(args.status))
+    else:
+        ok = calibrate_argon2(args.target_ms, args.memory_cost, args.parallelism)
+    raise SystemExit(0 if ok else 1)